@@ -0,0 +1,65 @@
+"""Gunicorn settings for production deployments.
+
+    gunicorn -c gunicorn.conf.py
+
+Serves ``secret_manager.wsgi`` on threaded sync workers, or
+``secret_manager.asgi`` on uvicorn workers when ``ASYNC_VIEWS=1``. The
+worker count defaults to one per core for ASGI and ``2 * cores + 1`` for
+WSGI. Every worker starts its own decrypt process pool of
+``DECRYPT_POOL_WORKERS`` processes, ``workers * DECRYPT_POOL_WORKERS`` in
+total. The worker count is exported as ``SERVER_WORKERS`` so that the pool
+size defaults to the cores divided among the workers, at least one each.
+
+Migrations are not run here; run ``python manage.py migrate`` once per
+deploy before starting the server.
+"""
+
+import glob
+import multiprocessing
+import os
+
+cores = multiprocessing.cpu_count()
+async_views = os.getenv("ASYNC_VIEWS", "0") == "1"
+
+bind = os.getenv("SERVER_BIND", "0.0.0.0:8000")
+
+if async_views:
+    wsgi_app = "secret_manager.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+    workers = int(os.getenv("SERVER_WORKERS", str(cores)))
+else:
+    wsgi_app = "secret_manager.wsgi:application"
+    worker_class = "gthread"
+    workers = int(os.getenv("SERVER_WORKERS", str(cores * 2 + 1)))
+    threads = int(os.getenv("SERVER_THREADS", "4"))
+
+# Read by the settings to size each worker's decrypt pool
+os.environ["SERVER_WORKERS"] = str(workers)
+
+timeout = int(os.getenv("SERVER_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("SERVER_KEEPALIVE", "5"))
+
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.getenv("SERVER_MAX_REQUESTS", "10000"))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("SERVER_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    # Multiprocess metrics files from a previous run would be aggregated too
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, "*.db")):
+            os.remove(path)
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
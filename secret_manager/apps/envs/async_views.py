@@ -0,0 +1,381 @@
+"""Async versions of the env views, served when ``ASYNC_VIEWS`` is on.
+
+Database access goes through Django's async ORM and crypto never runs on the
+event loop: decryption is sent to the worker process pool and encryption to
+the bounded crypto thread pool (see ``workers``). Views without crypto or
+heavy queries are re-exported from ``views``; Django runs those in a thread.
+"""
+
+import json
+import logging
+import random
+
+import rsa
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from secret_manager.apps.envs import crypto, importer, large, quota, workers
+from secret_manager.apps.envs.models import Env, EnvSecret
+from secret_manager.apps.envs.views import (  # noqa: F401
+    ENV_LIST_FIELDS,
+    LARGE_SECRET_ERROR,
+    batch_allowed,
+    batch_items,
+    batch_keys,
+    batch_results,
+    cached_values,
+    change_access_password,
+    content_length,
+    delete_secret,
+    env_row,
+    error_response,
+    get_stats,
+    import_response,
+    large_env_response,
+    limit_exceeded_response,
+    store_values,
+    update_env,
+    user_env_item,
+)
+from secret_manager.auth import async_jwt_required
+from secret_manager.db_router import pinned
+from secret_manager.querybudget import query_budget
+from secret_manager.utili import (
+    achunked,
+    apaginate,
+    page_params,
+    stream_format,
+    stream_response,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def decrypt_values(envs):
+    results, misses, rows = cached_values(envs)
+    return store_values(envs, results, misses, await workers.adecrypt_rows(rows))
+
+
+async def seal_value(value):
+    sealed = await workers.run_in_thread(crypto.encrypt, value)
+    secret = await EnvSecret.objects.acreate(
+        key=sealed.key, scheme=sealed.scheme, key_version=sealed.key_version
+    )
+    return sealed.value, secret
+
+
+async def user_env_rows(user, envs):
+    async for chunk in achunked(envs, settings.STREAM_CHUNK_SIZE):
+        for env, (value, error) in zip(chunk, await decrypt_values(chunk)):
+            yield user_env_item(user, env, value, error)
+
+
+@query_budget(1)
+@csrf_exempt
+async def get_envs(request):
+    if request.method == "GET":
+        envs = Env.objects.values(*ENV_LIST_FIELDS)
+        try:
+            fmt = stream_format(request)
+            if fmt:
+                rows = pinned(envs.order_by("createdAt", "id")).aiterator(
+                    chunk_size=settings.STREAM_CHUNK_SIZE
+                )
+                return stream_response(
+                    "Successfully fetched all envs",
+                    (env_row(row) async for row in rows),
+                    fmt,
+                )
+
+            cursor, limit = page_params(request)
+            rows, next_cursor = await apaginate(envs, cursor, limit)
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        return JsonResponse(
+            {
+                "message": "Successfully fetched all envs",
+                "data": [env_row(row) for row in rows],
+                "next_cursor": next_cursor,
+            }
+        )
+    return error_response("Invalid request method", 405)
+
+
+@query_budget(4)
+@csrf_exempt
+@async_jwt_required
+async def add_env(request):
+    if request.method == "POST":
+        try:
+            data = json.loads(request.body)
+            name = data.get("name")
+            value = data.get("value")
+            description = data.get("description")
+            if not name:
+                return error_response("Secret name is missing", 400)
+            if not value:
+                return error_response("Secret value is missing", 400)
+
+            encrypted_value, secret = await seal_value(value)
+
+            env = Env(
+                name=name,
+                value=encrypted_value,
+                user=request.principal,
+                key_id=secret,
+                description=description,
+                access_password=random.randbytes(4).hex(),
+            )
+            await env.asave()
+
+            return JsonResponse(
+                {
+                    "message": "Env created successfully",
+                    "data": {
+                        "id": env.id,
+                        "name": env.name,
+                        "value": value,
+                        "access_password": env.access_password,
+                        "description": env.description,
+                    },
+                }
+            )
+        except json.JSONDecodeError:
+            return HttpResponseBadRequest("Invalid JSON format")
+        except (crypto.CryptoError, rsa.pkcs1.CryptoError):
+            return error_response("Encryption failed", 500)
+        except IntegrityError:
+            return error_response("Secret with same name already exists", 400)
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}", exc_info=True)
+            return error_response(str(e), 500)
+
+    return error_response("Invalid request method", 405)
+
+
+@query_budget(2)
+@csrf_exempt
+async def get_env(request):
+    if request.method == "GET":
+        try:
+            key = request.GET.get("key")
+            access_password = request.GET.get("access_password")
+
+            if not key or not access_password:
+                return error_response("Missing key or access password", 400)
+
+            env = (
+                await Env.objects.select_related("key_id")
+                .with_user_email()
+                .aget(id=key)
+            )
+
+            if env.size is not None:
+                return error_response(LARGE_SECRET_ERROR, 400)
+            if env.api_requests <= 0:
+                return limit_exceeded_response(env)
+            if access_password != env.access_password:
+                return error_response("Invalid access password", 401)
+
+            remaining = await sync_to_async(quota.consume)(env)
+            if remaining is None:
+                return limit_exceeded_response(env)
+
+            [(value, error)] = await decrypt_values([env])
+            if error is not None:
+                return error_response("Decryption failed", 500)
+
+            return JsonResponse(
+                {
+                    "message": "Successfully fetched env",
+                    "data": {
+                        "name": env.name,
+                        "value": value,
+                        "user": env.user_email,
+                    },
+                }
+            )
+        except Env.DoesNotExist:
+            return error_response("Env not found", 404)
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}", exc_info=True)
+            return error_response(str(e), 500)
+
+    return error_response("Invalid request method", 405)
+
+
+@query_budget(2)
+@csrf_exempt
+async def batch_get_env(request):
+    if request.method == "POST":
+        try:
+            items = batch_items(json.loads(request.body))
+            envs = (
+                await Env.objects.select_related("key_id")
+                .with_user_email()
+                .ain_bulk(batch_keys(items))
+            )
+
+            remaining = await sync_to_async(quota.consume_many)(
+                batch_allowed(items, envs)
+            )
+            served = [env for env in envs.values() if env.id in remaining]
+            values = dict(
+                zip([env.id for env in served], await decrypt_values(served))
+            )
+
+            return JsonResponse(
+                {
+                    "message": "Successfully fetched envs",
+                    "data": batch_results(items, envs, values),
+                }
+            )
+        except json.JSONDecodeError:
+            return HttpResponseBadRequest("Invalid JSON format")
+        except ValueError as e:
+            return error_response(str(e), 400)
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}", exc_info=True)
+            return error_response(str(e), 500)
+
+    return error_response("Invalid request method", 405)
+
+
+@query_budget(3)
+@csrf_exempt
+@async_jwt_required
+async def import_envs(request):
+    if request.method == "POST":
+        try:
+            values = importer.parse(request.body, request.content_type)
+            existing = {
+                env.name: env
+                async for env in importer.existing_envs(request.principal, values)
+            }
+            current = dict(zip(existing, await decrypt_values(list(existing.values()))))
+            # Encryption goes to the worker pool and the upsert needs a
+            # transaction, both from a thread
+            results = await sync_to_async(importer.upsert)(
+                request.principal, values, existing, current
+            )
+            return import_response(results)
+        except json.JSONDecodeError:
+            return HttpResponseBadRequest("Invalid JSON format")
+        except ValueError as e:
+            return error_response(str(e), 400)
+        except (crypto.CryptoError, rsa.pkcs1.CryptoError):
+            return error_response("Encryption failed", 500)
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}", exc_info=True)
+            return error_response(str(e), 500)
+
+    return error_response("Invalid request method", 405)
+
+
+@query_budget(4)
+@csrf_exempt
+@async_jwt_required
+async def upload_env(request):
+    if request.method == "POST":
+        name = request.GET.get("name")
+        if not name:
+            return error_response("Secret name is missing", 400)
+
+        env = Env(
+            name=name,
+            user=request.principal,
+            description=request.GET.get("description"),
+            access_password=random.randbytes(4).hex(),
+        )
+        try:
+            # ASGI spools the body to a temporary file before the view runs,
+            # it is read from there a chunk at a time
+            await sync_to_async(large.store)(env, request, content_length(request))
+            return large_env_response(env)
+        except large.SecretTooLarge as e:
+            return error_response(str(e), 413)
+        except ValueError as e:
+            return error_response(str(e), 400)
+        except crypto.CryptoError:
+            return error_response("Encryption failed", 500)
+        except IntegrityError:
+            return error_response("Secret with same name already exists", 400)
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}", exc_info=True)
+            return error_response(str(e), 500)
+
+    return error_response("Invalid request method", 405)
+
+
+@query_budget(3)
+@csrf_exempt
+async def download_env(request):
+    if request.method == "GET":
+        try:
+            key = request.GET.get("key")
+            access_password = request.GET.get("access_password")
+
+            if not key or not access_password:
+                return error_response("Missing key or access password", 400)
+
+            env = (
+                await Env.objects.select_related("key_id")
+                .with_user_email()
+                .aget(id=key)
+            )
+
+            if env.size is None:
+                return error_response("Env is not a large secret", 400)
+            if env.api_requests <= 0:
+                return limit_exceeded_response(env)
+            if access_password != env.access_password:
+                return error_response("Invalid access password", 401)
+            if await sync_to_async(quota.consume)(env) is None:
+                return limit_exceeded_response(env)
+
+            response = StreamingHttpResponse(
+                large.aiter_plaintext(env), content_type="application/octet-stream"
+            )
+            response["Content-Length"] = str(env.size)
+            return response
+        except Env.DoesNotExist:
+            return error_response("Env not found", 404)
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}", exc_info=True)
+            return error_response(str(e), 500)
+
+    return error_response("Invalid request method", 405)
+
+
+@query_budget(3)
+@csrf_exempt
+@async_jwt_required
+async def get_envs_by_user(request):
+    if request.method == "GET":
+        user = request.principal
+        try:
+            fmt = stream_format(request)
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        envs = Env.objects.filter(user=user).select_related("key_id")
+        if fmt:
+            rows = pinned(envs.order_by("createdAt", "id")).aiterator(
+                chunk_size=settings.STREAM_CHUNK_SIZE
+            )
+            return stream_response(
+                "Successfully fetched all envs", user_env_rows(user, rows), fmt
+            )
+
+        return JsonResponse(
+            {
+                "message": "Successfully fetched all envs",
+                "data": [item async for item in user_env_rows(user, envs)],
+            }
+        )
+
+    return error_response("Invalid request method", 405)
@@ -0,0 +1,86 @@
+"""Bounded LRU/TTL cache of decrypted env values.
+
+Entries are keyed by ``Env.id`` and only served while the row's
+``updatedAt`` matches, so a write in any process makes the cached value stale
+everywhere. Values are kept in ``bytearray`` buffers that are zeroed when an
+entry is evicted, expired or invalidated.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from secret_manager.metrics import cache_lookup
+
+
+class SecretCache:
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, env):
+        """Return the cached plaintext of ``env`` or ``None``."""
+        with self._lock:
+            entry = self._entries.get(env.id)
+            if entry is None:
+                self.misses += 1
+                cache_lookup("secret", hit=False)
+                return None
+            updated_at, expires_at, buffer = entry
+            if updated_at != env.updatedAt or expires_at <= time.monotonic():
+                self._drop(env.id)
+                self.misses += 1
+                cache_lookup("secret", hit=False)
+                return None
+            self._entries.move_to_end(env.id)
+            self.hits += 1
+            cache_lookup("secret", hit=True)
+            return buffer.decode()
+
+    def set(self, env, value):
+        if self.max_size <= 0:
+            return
+        entry = (env.updatedAt, time.monotonic() + self.ttl, bytearray(value.encode()))
+        with self._lock:
+            self._drop(env.id)
+            self._entries[env.id] = entry
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, env_id):
+        with self._lock:
+            self._drop(env_id)
+
+    def clear(self):
+        with self._lock:
+            for env_id in list(self._entries):
+                self._drop(env_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _drop(self, env_id):
+        entry = self._entries.pop(env_id, None)
+        if entry is not None:
+            buffer = entry[2]
+            buffer[:] = bytes(len(buffer))
+
+
+secret_cache = SecretCache(
+    max_size=settings.SECRET_CACHE_SIZE, ttl=settings.SECRET_CACHE_TTL
+)
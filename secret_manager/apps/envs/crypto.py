@@ -0,0 +1,188 @@
+"""Encryption schemes for env values.
+
+``rsa``
+    Legacy scheme. Every secret gets its own RSA-1024 keypair and the private
+    key is stored in ``EnvSecret.key`` as PKCS#1 DER.
+
+``envelope``
+    A random AES-256-GCM data key encrypts the value. The data key is wrapped
+    with the versioned master key from ``ENV_MASTER_KEYS`` and stored in
+    ``EnvSecret.key``; ``EnvSecret.key_version`` records which master key.
+
+Ciphertext and key material are raw bytes, stored in binary columns.
+
+Large secrets always use envelope keys. Their plaintext is encrypted in
+chunks (``encrypt_chunk``), each with its own nonce and the chunk's position
+as associated data.
+"""
+
+import base64
+import hashlib
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+import rsa
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from django.conf import settings
+from pyasn1.error import PyAsn1Error
+
+from secret_manager.apps.envs import keypool
+from secret_manager.metrics import crypto_timer
+
+SCHEME_RSA = "rsa"
+SCHEME_ENVELOPE = "envelope"
+SCHEME_CHOICES = [
+    (SCHEME_RSA, "RSA"),
+    (SCHEME_ENVELOPE, "Envelope"),
+]
+
+NONCE_SIZE = 12
+DATA_KEY_AAD = b"secret-manager/data-key"
+CHUNK_AAD = b"secret-manager/chunk"
+
+Sealed = namedtuple("Sealed", ["value", "key", "scheme", "key_version"])
+
+
+class CryptoError(Exception):
+    pass
+
+
+@lru_cache(maxsize=1)
+def master_keys():
+    """Return ``{version: key}`` parsed from ``ENV_MASTER_KEYS``.
+
+    The setting holds comma separated ``<version>:<base64 key>`` pairs. When
+    it is empty a single version 1 key is derived from ``SECRET_KEY``.
+    """
+    raw = settings.ENV_MASTER_KEYS
+    if not raw:
+        if not settings.SECRET_KEY:
+            raise CryptoError("ENV_MASTER_KEYS or SECRET_KEY must be set")
+        return {1: hashlib.sha256(settings.SECRET_KEY.encode()).digest()}
+
+    keys = {}
+    for entry in raw.split(","):
+        version, _, encoded = entry.strip().partition(":")
+        key = base64.b64decode(encoded)
+        if len(key) != 32:
+            raise CryptoError(f"Master key {version} must be 32 bytes")
+        keys[int(version)] = key
+    return keys
+
+
+def current_key_version():
+    keys = master_keys()
+    version = settings.ENV_MASTER_KEY_VERSION or max(keys)
+    if version not in keys:
+        raise CryptoError(f"Unknown master key version {version}")
+    return version
+
+
+def wrap_data_key(data_key, version=None):
+    version = version or current_key_version()
+    nonce = os.urandom(NONCE_SIZE)
+    wrapped = AESGCM(master_keys()[version]).encrypt(nonce, data_key, DATA_KEY_AAD)
+    return nonce + wrapped, version
+
+
+def unwrap_data_key(key, version):
+    try:
+        master_key = master_keys()[version]
+    except KeyError:
+        raise CryptoError(f"Unknown master key version {version}")
+    wrapped = bytes(key)
+    try:
+        return AESGCM(master_key).decrypt(
+            wrapped[:NONCE_SIZE], wrapped[NONCE_SIZE:], DATA_KEY_AAD
+        )
+    except InvalidTag:
+        raise CryptoError("Data key could not be unwrapped")
+
+
+def new_data_key():
+    """Return a new data key, its wrapped form and the master key version."""
+    data_key = AESGCM.generate_key(bit_length=256)
+    return (data_key, *wrap_data_key(data_key))
+
+
+def _chunk_aad(index, last):
+    # Binding the position and the last flag makes reordered, missing or
+    # truncated chunks fail authentication
+    return CHUNK_AAD + index.to_bytes(8, "big") + (b"\x01" if last else b"\x00")
+
+
+def encrypt_chunk(data_key, index, chunk, last):
+    """Encrypt chunk ``index`` of a large secret."""
+    with crypto_timer("encrypt_chunk", SCHEME_ENVELOPE):
+        nonce = os.urandom(NONCE_SIZE)
+        return nonce + AESGCM(data_key).encrypt(nonce, chunk, _chunk_aad(index, last))
+
+
+def decrypt_chunk(data_key, index, data, last):
+    """Decrypt chunk ``index`` of a large secret, ``last`` if none follow."""
+    data = bytes(data)
+    with crypto_timer("decrypt_chunk", SCHEME_ENVELOPE):
+        try:
+            return AESGCM(data_key).decrypt(
+                data[:NONCE_SIZE], data[NONCE_SIZE:], _chunk_aad(index, last)
+            )
+        except InvalidTag:
+            raise CryptoError(f"Chunk {index} could not be decrypted")
+
+
+def encrypt(value, scheme=None):
+    """Encrypt ``value`` and return a ``Sealed`` tuple ready to be stored."""
+    scheme = scheme or settings.ENV_ENCRYPTION_SCHEME
+    plaintext = value.encode()
+
+    if scheme == SCHEME_RSA:
+        with crypto_timer("keygen", SCHEME_RSA):
+            publicKey, privateKey = keypool.newkeys(1024)
+        with crypto_timer("encrypt", SCHEME_RSA):
+            encrypted_value = rsa.encrypt(plaintext, publicKey)
+        return Sealed(encrypted_value, privateKey.save_pkcs1("DER"), SCHEME_RSA, None)
+
+    if scheme == SCHEME_ENVELOPE:
+        with crypto_timer("encrypt", SCHEME_ENVELOPE):
+            data_key = AESGCM.generate_key(bit_length=256)
+            nonce = os.urandom(NONCE_SIZE)
+            encrypted_value = nonce + AESGCM(data_key).encrypt(nonce, plaintext, None)
+            key, version = wrap_data_key(data_key)
+        return Sealed(encrypted_value, key, SCHEME_ENVELOPE, version)
+
+    raise CryptoError(f"Unknown encryption scheme {scheme}")
+
+
+def decrypt(value, key, scheme, key_version=None):
+    """Decrypt a stored ``value`` with the key material it was sealed with."""
+    # PostgreSQL drivers may hand binary columns back as memoryview
+    encrypted_value = bytes(value)
+
+    if scheme == SCHEME_RSA:
+        try:
+            with crypto_timer("decrypt", SCHEME_RSA):
+                private_key = rsa.PrivateKey.load_pkcs1(bytes(key), "DER")
+                return rsa.decrypt(encrypted_value, private_key).decode()
+        except (ValueError, PyAsn1Error, rsa.pkcs1.CryptoError) as e:
+            raise CryptoError(str(e))
+
+    if scheme == SCHEME_ENVELOPE:
+        with crypto_timer("decrypt", SCHEME_ENVELOPE):
+            data_key = unwrap_data_key(key, key_version)
+            try:
+                return (
+                    AESGCM(data_key)
+                    .decrypt(encrypted_value[:NONCE_SIZE], encrypted_value[NONCE_SIZE:], None)
+                    .decode()
+                )
+            except InvalidTag:
+                raise CryptoError("Value could not be decrypted")
+
+    raise CryptoError(f"Unknown encryption scheme {scheme}")
+
+
+def decrypt_env(env):
+    secret = env.key_id
+    return decrypt(env.value, secret.key, secret.scheme, secret.key_version)
@@ -0,0 +1,169 @@
+"""Bulk import of envs from a ``.env`` file or a JSON object.
+
+Every value is compared with the current value of the env of the same name;
+only new and changed values are encrypted, on the worker pool for large
+imports. The new key rows and envs are then written in one transaction with
+batched INSERTs, updated envs as an upsert on the ``(name, user)``
+constraint. Updated envs keep their id, access password, description and
+quota.
+"""
+
+import io
+import json
+import random
+
+import dotenv
+from django.conf import settings
+from django.db import transaction
+
+from secret_manager.apps.envs import workers
+from secret_manager.apps.envs.cache import secret_cache
+from secret_manager.apps.envs.models import Env, EnvChunk, EnvSecret
+from secret_manager.querybudget import unbudgeted
+
+CREATED = "created"
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+
+# Rows inserted per statement
+WRITE_BATCH = 100
+
+NAME_MAX_LENGTH = Env._meta.get_field("name").max_length
+
+# Columns an import rewrites on an existing env
+UPSERT_FIELDS = ["value", "key_id", "size", "updatedAt"]
+
+
+def parse(body, content_type):
+    """Return the ``{name: value}`` pairs of a JSON object or ``.env`` body."""
+    if content_type == "application/json":
+        values = json.loads(body)
+        if not isinstance(values, dict):
+            raise ValueError("Expected a JSON object of names and values")
+    else:
+        try:
+            text = body.decode()
+        except UnicodeDecodeError:
+            raise ValueError("The .env file is not valid UTF-8")
+        # Values are stored as written, ${VAR} references are not expanded
+        values = dotenv.dotenv_values(stream=io.StringIO(text), interpolate=False)
+
+    if not values:
+        raise ValueError("No secrets to import")
+    if len(values) > settings.ENV_IMPORT_MAX_ITEMS:
+        raise ValueError(f"At most {settings.ENV_IMPORT_MAX_ITEMS} secrets are allowed")
+    for name, value in values.items():
+        if not name or len(name) > NAME_MAX_LENGTH:
+            raise ValueError(f"Invalid secret name {name!r}")
+        if not isinstance(value, str) or not value:
+            raise ValueError(f"Secret value of {name} is missing")
+    return values
+
+
+def existing_envs(user, values):
+    """Envs of ``user`` named in ``values``, with their key rows."""
+    return Env.objects.filter(user=user, name__in=list(values)).select_related(
+        "key_id"
+    )
+
+
+def upsert(user, values, existing, current):
+    """Store ``values`` as envs of ``user``.
+
+    ``existing`` maps names to the user's envs loaded with
+    ``existing_envs`` and ``current`` their ``(value, error)`` pairs from
+    ``decrypt_values``. Returns a result per name, in the order given.
+
+    An env of the same name created after ``existing`` was loaded is
+    overwritten rather than failing the import: it keeps its id and access
+    password, its old key row is deleted and it is reported as updated.
+    """
+    statuses = {}
+    for name, value in values.items():
+        env = existing.get(name)
+        if env is None:
+            statuses[name] = CREATED
+        elif env.size is None and current[name] == (value, None):
+            statuses[name] = UNCHANGED
+        else:
+            statuses[name] = UPDATED
+
+    changed = [name for name, status in statuses.items() if status != UNCHANGED]
+    sealed = workers.seal_values([values[name] for name in changed])
+
+    secrets, envs = [], {}
+    for name, seal in zip(changed, sealed):
+        secret = EnvSecret(key=seal.key, scheme=seal.scheme, key_version=seal.key_version)
+        secrets.append(secret)
+        envs[name] = Env(
+            name=name,
+            value=seal.value,
+            user=user,
+            key_id=secret,
+            access_password=random.randbytes(4).hex(),
+        )
+
+    updated = [existing[name] for name in changed if statuses[name] == UPDATED]
+    created = [name for name in changed if statuses[name] == CREATED]
+    raced = []
+    if changed:
+        # The INSERT and DELETE batches grow with the import, they are left
+        # out of the request's budget
+        with transaction.atomic(savepoint=False), unbudgeted():
+            EnvSecret.objects.bulk_create(secrets, batch_size=WRITE_BATCH)
+            Env.objects.bulk_create(
+                [envs[env.name] for env in updated],
+                batch_size=WRITE_BATCH,
+                update_conflicts=True,
+                unique_fields=["name", "user"],
+                update_fields=UPSERT_FIELDS,
+            )
+            Env.objects.bulk_create(
+                [envs[name] for name in created],
+                batch_size=WRITE_BATCH,
+                ignore_conflicts=True,
+            )
+            # Names created concurrently kept the other env: take it over
+            # like an update, keeping its id and password
+            stored = (
+                Env.objects.select_for_update()
+                .filter(user=user, name__in=created)
+                .values_list("name", "id", "access_password", "key_id", "size")
+            )
+            for name, id, access_password, key_id, size in stored:
+                env = envs[name]
+                if id != env.id:
+                    statuses[name] = UPDATED
+                    env.id, env.access_password = id, access_password
+                    raced.append(Env(id=id, key_id_id=key_id, size=size))
+            if raced:
+                Env.objects.bulk_update(
+                    [envs[name] for name in created if statuses[name] == UPDATED],
+                    UPSERT_FIELDS,
+                    batch_size=WRITE_BATCH,
+                )
+            replaced = updated + raced
+
+            # Updated large secrets are stored inline from now on
+            large = [env.id for env in replaced if env.size is not None]
+            if large:
+                EnvChunk.objects.filter(env_id__in=large).delete()
+            if replaced:
+                EnvSecret.objects.filter(
+                    id__in=[env.key_id_id for env in replaced]
+                ).delete()
+        for env in replaced:
+            secret_cache.invalidate(env.id)
+
+    results = []
+    for name, status in statuses.items():
+        env = existing.get(name) or envs[name]
+        results.append(
+            {
+                "id": env.id,
+                "name": name,
+                "status": status,
+                "access_password": env.access_password,
+            }
+        )
+    return results
@@ -0,0 +1,161 @@
+"""Pool of pre-generated RSA keypairs for the legacy ``rsa`` scheme.
+
+``rsa.newkeys`` is pure Python and takes tens to hundreds of milliseconds, so
+keypairs are generated ahead of time in worker processes. Request threads pop
+a ready keypair and only generate one inline when the pool is empty.
+"""
+
+import atexit
+import logging
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import rsa
+from django.conf import settings
+
+from secret_manager.metrics import cache_lookup
+
+logger = logging.getLogger(__name__)
+
+
+class KeyPool:
+    def __init__(self, size, low_water, workers, bits=1024):
+        self.size = size
+        self.low_water = low_water
+        self.workers = workers
+        self.bits = bits
+        self.hits = 0
+        self.misses = 0
+        self._keys = deque()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def get(self):
+        """Return a ``(publicKey, privateKey)`` pair."""
+        with self._lock:
+            if self._keys:
+                keypair = self._keys.popleft()
+                self.hits += 1
+            else:
+                keypair = None
+                self.misses += 1
+        cache_lookup("rsa_key_pool", hit=keypair is not None)
+
+        self.refill()
+        if keypair is None:
+            keypair = rsa.newkeys(self.bits)
+        return keypair
+
+    def refill(self):
+        """Top the pool up to ``size`` once it drops to the low-water mark."""
+        with self._lock:
+            available = len(self._keys) + self._pending
+            if available > self.low_water:
+                return
+            missing = self.size - available
+            self._pending += missing
+            executor = self._get_executor()
+
+        for submitted in range(missing):
+            try:
+                future = executor.submit(rsa.newkeys, self.bits)
+            except BrokenProcessPool as e:
+                logger.warning(f"RSA key pool workers died, restarting: {e}")
+                with self._lock:
+                    self._pending -= missing - submitted
+                    if self._executor is executor:
+                        self._executor = None
+                executor.shutdown(wait=False, cancel_futures=True)
+                return
+            future.add_done_callback(self._store)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "depth": len(self._keys),
+                "pending": self._pending,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn rather than fork, the parent is usually a threaded server
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _store(self, future):
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled():
+                return
+            try:
+                keypair = future.result()
+            except Exception as e:
+                logger.warning(f"RSA key generation failed: {e}")
+                return
+            if len(self._keys) < self.size:
+                self._keys.append(keypair)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+# Set in worker processes that should not start a key pool of their own
+_inline = False
+
+
+def generate_inline():
+    """Make ``newkeys`` generate keys inline in this process.
+
+    Used as the initializer of worker pools that encrypt in bulk, where every
+    worker is already busy generating keys.
+    """
+    global _inline
+    _inline = True
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = KeyPool(
+                    size=settings.RSA_KEY_POOL_SIZE,
+                    low_water=settings.RSA_KEY_POOL_LOW_WATER,
+                    workers=settings.RSA_KEY_POOL_WORKERS,
+                )
+                atexit.register(_pool.shutdown)
+    return _pool
+
+
+def newkeys(bits=1024):
+    """Drop-in for ``rsa.newkeys`` that serves 1024 bit keys from the pool."""
+    if bits != 1024 or settings.RSA_KEY_POOL_SIZE <= 0 or _inline:
+        return rsa.newkeys(bits)
+    return get_pool().get()
+
+
+def stats():
+    if _pool is None:
+        return {
+            "size": settings.RSA_KEY_POOL_SIZE,
+            "depth": 0,
+            "pending": 0,
+            "hits": 0,
+            "misses": 0,
+        }
+    return _pool.stats()
@@ -0,0 +1,161 @@
+"""Large secrets: values stored as a sequence of encrypted chunks.
+
+A large secret is an ``Env`` with ``size`` set and an empty ``value``. Its
+plaintext is split into ``LARGE_SECRET_CHUNK_SIZE`` pieces, each encrypted
+with the env's envelope data key and stored as an ``EnvChunk`` row. Uploads
+are read from the request and encrypted a chunk at a time into a temporary
+file, then written in one short transaction; downloads are decrypted a chunk
+at a time. A worker holds a few chunks in memory whatever the size of the
+secret.
+"""
+
+import tempfile
+
+from django.conf import settings
+from django.db import transaction
+
+from secret_manager.apps.envs import crypto, workers
+from secret_manager.apps.envs.models import EnvChunk, EnvSecret
+from secret_manager.querybudget import unbudgeted
+
+# Chunks inserted per statement on upload and fetched per round trip on download
+WRITE_BATCH = 16
+READ_BATCH = 16
+
+
+class SecretTooLarge(ValueError):
+    pass
+
+
+def read_chunks(stream, size):
+    """Yield ``(chunk, last)`` pairs read from the file-like ``stream``."""
+    chunk = stream.read(size)
+    while chunk:
+        following = stream.read(size)
+        yield chunk, not following
+        chunk = following
+
+
+def check_size(size):
+    if size <= 0:
+        raise ValueError("Secret value is missing")
+    if size > settings.LARGE_SECRET_MAX_BYTES:
+        raise SecretTooLarge(
+            f"Secrets are limited to {settings.LARGE_SECRET_MAX_BYTES} bytes"
+        )
+
+
+def _encrypt_to_spool(data_key, stream, size):
+    """Encrypt ``size`` bytes read from ``stream`` into a temporary file.
+
+    Returns the file, rewound, and the length of every encrypted chunk in
+    order. Only ciphertext is written, and it stays in memory up to one
+    write batch before going to disk.
+    """
+    spool = tempfile.SpooledTemporaryFile(
+        max_size=WRITE_BATCH * settings.LARGE_SECRET_CHUNK_SIZE
+    )
+    try:
+        received = 0
+        lengths = []
+        chunks = read_chunks(stream, settings.LARGE_SECRET_CHUNK_SIZE)
+        for index, (chunk, last) in enumerate(chunks):
+            received += len(chunk)
+            if received > size:
+                raise ValueError("Request body is longer than its Content-Length")
+            data = crypto.encrypt_chunk(data_key, index, chunk, last)
+            spool.write(data)
+            lengths.append(len(data))
+        if received != size:
+            raise ValueError("Request body is shorter than its Content-Length")
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+    return spool, lengths
+
+
+def store(env, stream, size):
+    """Encrypt ``size`` bytes read from ``stream`` as the value of the new ``env``.
+
+    The whole body is read and encrypted before the database is touched, so
+    a slow client does not hold a transaction open. ``env`` and its chunks
+    are then saved in one transaction, nothing is kept when the stream ends
+    early or encryption fails. Inside an outer transaction no savepoint is
+    made, a failure rolls the outer one back.
+    """
+    check_size(size)
+    data_key, key, version = crypto.new_data_key()
+    spool, lengths = _encrypt_to_spool(data_key, stream, size)
+    with spool, transaction.atomic(savepoint=False):
+        env.key_id = EnvSecret.objects.create(
+            key=key, scheme=crypto.SCHEME_ENVELOPE, key_version=version
+        )
+        env.value = b""
+        env.size = size
+        env.save()
+
+        for start in range(0, len(lengths), WRITE_BATCH):
+            batch = [
+                EnvChunk(env=env, index=index, data=spool.read(length))
+                for index, length in enumerate(
+                    lengths[start : start + WRITE_BATCH], start
+                )
+            ]
+            with unbudgeted():
+                EnvChunk.objects.bulk_create(batch)
+    return env
+
+
+def _chunk_rows(env):
+    # Read lazily by the streaming response, after the request's routing
+    # state is gone: use the database the env came from, which committed
+    # its chunks with it
+    return (
+        EnvChunk.objects.using(env._state.db)
+        .filter(env=env)
+        .order_by("index")
+        .values_list("data", flat=True)
+    )
+
+
+def _with_last(rows):
+    """Yield ``(index, row, last)``, looking one row ahead."""
+    index, previous = 0, None
+    for row in rows:
+        if previous is not None:
+            yield index, previous, False
+            index += 1
+        previous = row
+    if previous is None:
+        raise crypto.CryptoError("Large secret has no chunks")
+    yield index, previous, True
+
+
+def iter_plaintext(env):
+    """Yield the decrypted chunks of large secret ``env``."""
+    secret = env.key_id
+    data_key = crypto.unwrap_data_key(secret.key, secret.key_version)
+    rows = _chunk_rows(env).iterator(chunk_size=READ_BATCH)
+    for index, data, last in _with_last(rows):
+        yield crypto.decrypt_chunk(data_key, index, data, last)
+
+
+async def aiter_plaintext(env):
+    """Async version of ``iter_plaintext``, decrypting off the event loop."""
+    secret = env.key_id
+    data_key = await workers.run_in_thread(
+        crypto.unwrap_data_key, secret.key, secret.key_version
+    )
+    previous = None
+    index = 0
+    async for data in _chunk_rows(env).aiterator(chunk_size=READ_BATCH):
+        if previous is not None:
+            yield await workers.run_in_thread(
+                crypto.decrypt_chunk, data_key, index, previous, False
+            )
+            index += 1
+        previous = data
+    if previous is None:
+        raise crypto.CryptoError("Large secret has no chunks")
+    yield await workers.run_in_thread(crypto.decrypt_chunk, data_key, index, previous, True)
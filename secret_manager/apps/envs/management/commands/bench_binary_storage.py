@@ -0,0 +1,143 @@
+import random
+import time
+
+import rsa
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+
+from secret_manager.apps.envs import crypto
+from secret_manager.apps.envs.management.scratch import format_size, table_size
+from secret_manager.utili import ulid
+
+# Column types of the ciphertext and key: the old hex and PEM text, and bytes
+LAYOUTS = {
+    "text": models.TextField(),
+    "binary": models.BinaryField(),
+}
+
+
+def text_row(sealed):
+    """Encode ``sealed`` the way it was stored before binary columns."""
+    if sealed.scheme == crypto.SCHEME_RSA:
+        key = rsa.PrivateKey.load_pkcs1(sealed.key, "DER").save_pkcs1().decode()
+    else:
+        key = sealed.key.hex()
+    return sealed.value.hex(), key
+
+
+def read_text(value, key, scheme):
+    if scheme == crypto.SCHEME_RSA:
+        return bytes.fromhex(value), rsa.PrivateKey.load_pkcs1(key.encode())
+    return bytes.fromhex(value), bytes.fromhex(key)
+
+
+def read_binary(value, key, scheme):
+    if scheme == crypto.SCHEME_RSA:
+        return bytes(value), rsa.PrivateKey.load_pkcs1(bytes(key), "DER")
+    return bytes(value), bytes(key)
+
+
+READERS = {"text": read_text, "binary": read_binary}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare storing ciphertext and key material as hex/PEM text with "
+        "binary columns: table size, and the time to read a row and turn it "
+        "into the ciphertext bytes and key decrypt needs. Runs on scratch "
+        "tables that are dropped afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=50_000)
+        parser.add_argument("--lookups", type=int, default=5000)
+        parser.add_argument(
+            "--samples",
+            type=int,
+            default=10,
+            help="Distinct sealed values per scheme, rows reuse them",
+        )
+        parser.add_argument(
+            "--scheme",
+            nargs="+",
+            choices=[crypto.SCHEME_RSA, crypto.SCHEME_ENVELOPE],
+            default=[crypto.SCHEME_RSA, crypto.SCHEME_ENVELOPE],
+        )
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        self.connection = connections[options["database"]]
+        for scheme in options["scheme"]:
+            sealed = [
+                crypto.encrypt(f"bench-value-{i}", scheme=scheme)
+                for i in range(options["samples"])
+            ]
+            rows = [
+                (ulid(), sealed[i % len(sealed)]) for i in range(options["rows"])
+            ]
+            sample = random.Random(0).choices(
+                [row_id for row_id, _ in rows], k=options["lookups"]
+            )
+
+            for layout, field in LAYOUTS.items():
+                table = f"bench_storage_{layout}"
+                self.create(table, field)
+                try:
+                    self.fill(table, layout, field, rows)
+                    size = table_size(self.connection, table)
+                    seconds = self.measure(table, layout, sample)
+                finally:
+                    self.run_sql(f"DROP TABLE {self.qn(table)}")
+
+                self.stdout.write(
+                    f"{scheme:>8} {layout:>6}: table {format_size(size):>9}  "
+                    f"read {seconds / len(sample) * 1e6:6.1f}us/row"
+                )
+
+    def create(self, table, field):
+        column = field.db_type(self.connection)
+        self.run_sql(
+            f"CREATE TABLE {self.qn(table)} (id varchar(26) PRIMARY KEY, "
+            f"scheme varchar(10) NOT NULL, value {column} NOT NULL, "
+            f"key {column} NOT NULL)"
+        )
+
+    def fill(self, table, layout, field, rows):
+        encoded = {}
+        for _, sealed in rows:
+            if id(sealed) not in encoded:
+                value, key = (
+                    text_row(sealed) if layout == "text" else (sealed.value, sealed.key)
+                )
+                encoded[id(sealed)] = (
+                    field.get_db_prep_value(value, self.connection),
+                    field.get_db_prep_value(key, self.connection),
+                )
+        with transaction.atomic(using=self.connection.alias):
+            with self.connection.cursor() as cursor:
+                cursor.executemany(
+                    f"INSERT INTO {self.qn(table)} (id, scheme, value, key) "
+                    "VALUES (%s, %s, %s, %s)",
+                    [
+                        (row_id, sealed.scheme, *encoded[id(sealed)])
+                        for row_id, sealed in rows
+                    ],
+                )
+
+    def measure(self, table, layout, sample):
+        """Return the seconds taken to read and decode every row of ``sample``."""
+        read = READERS[layout]
+        sql = f"SELECT value, key, scheme FROM {self.qn(table)} WHERE id = %s"
+        with self.connection.cursor() as cursor:
+            start = time.perf_counter()
+            for row_id in sample:
+                cursor.execute(sql, [row_id])
+                read(*cursor.fetchone())
+            return time.perf_counter() - start
+
+    def qn(self, name):
+        return self.connection.ops.quote_name(name)
+
+    def run_sql(self, sql, params=None):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
@@ -0,0 +1,87 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import ConnectionHandler
+
+from secret_manager.apps.envs.management.stats import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the database cost of a request (one query, then the "
+        "end-of-request connection handling) when connecting per request, "
+        "with persistent connections and with a connection pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        base = dict(connections.settings[options["database"]])
+        base_options = {
+            k: v for k, v in base.get("OPTIONS", {}).items() if k != "pool"
+        }
+
+        modes = {
+            "connect per request": {
+                **base,
+                "CONN_MAX_AGE": 0,
+                "OPTIONS": base_options,
+            },
+            "persistent": {
+                **base,
+                "CONN_MAX_AGE": base["CONN_MAX_AGE"] or 60,
+                "CONN_HEALTH_CHECKS": True,
+                "OPTIONS": base_options,
+            },
+        }
+        if base["ENGINE"] == "django.db.backends.postgresql" and self.has_pool():
+            modes["pool"] = {
+                **base,
+                "CONN_MAX_AGE": 0,
+                "OPTIONS": {
+                    **base_options,
+                    "pool": base.get("OPTIONS", {}).get("pool") or True,
+                },
+            }
+
+        baseline = None
+        for name, config in modes.items():
+            timings = self.measure(config, options["requests"])
+            mean = statistics.fmean(timings)
+            baseline = baseline or mean
+            self.stdout.write(
+                f"{name:>20}: mean {mean * 1000:7.3f}ms  "
+                f"p50 {percentile(timings, 50) * 1000:7.3f}ms  "
+                f"p95 {percentile(timings, 95) * 1000:7.3f}ms  "
+                f"saved {(baseline - mean) * 1000:7.3f}ms/request"
+            )
+
+    def has_pool(self):
+        try:
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def measure(self, config, requests):
+        connection = ConnectionHandler({DEFAULT_DB_ALIAS: config})[DEFAULT_DB_ALIAS]
+        timings = []
+        try:
+            for _ in range(requests + 1):
+                start = time.perf_counter()
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
+                # What the request_finished signal does after every response
+                connection.close_if_unusable_or_obsolete()
+                timings.append(time.perf_counter() - start)
+        finally:
+            connection.close()
+            if hasattr(connection, "close_pool"):
+                connection.close_pool()
+        # The first request connects in every mode
+        return timings[1:]
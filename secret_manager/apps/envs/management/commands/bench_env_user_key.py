@@ -0,0 +1,143 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+
+from secret_manager.apps.envs.management.scratch import format_size, index_size
+from secret_manager.utili import ulid, uuid7
+
+# How envs reference their user: the old email key and the User.id key
+LAYOUTS = {
+    "email": models.EmailField(),
+    "id": models.UUIDField(),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare envs referencing their user by email with envs referencing "
+        "User.id: size of the user and (name, user) indexes, and the time of "
+        "the env-to-user join, the per-user listing and the name check. "
+        "Runs on scratch tables that are dropped afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--envs-per-user", type=int, default=50)
+        parser.add_argument("--lookups", type=int, default=5000)
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        self.connection = connections[options["database"]]
+        users = [
+            (uuid7(), f"bench-key-user-{i}@example.com") for i in range(options["users"])
+        ]
+        envs = [
+            (ulid(), f"BENCH_KEY_{j}", user)
+            for user in users
+            for j in range(options["envs_per_user"])
+        ]
+        sample = random.Random(0).choices(envs, k=options["lookups"])
+
+        for layout, field in LAYOUTS.items():
+            users_table = f"bench_key_users_{layout}"
+            envs_table = f"bench_key_envs_{layout}"
+            self.create(users_table, envs_table, field)
+            try:
+                self.fill(users_table, envs_table, layout, users, envs)
+                sizes = {
+                    index: index_size(self.connection, f"{envs_table}_{index}")
+                    for index in ("user", "name_user")
+                }
+                timings = self.measure(users_table, envs_table, layout, sample)
+            finally:
+                self.run_sql(f"DROP TABLE {self.qn(envs_table)}")
+                self.run_sql(f"DROP TABLE {self.qn(users_table)}")
+
+            self.stdout.write(
+                f"{layout:>6}: user index {format_size(sizes['user']):>9}  "
+                f"(name, user) index {format_size(sizes['name_user']):>9}  "
+                + "  ".join(
+                    f"{name} {seconds / len(sample) * 1e6:6.1f}us"
+                    for name, seconds in timings.items()
+                )
+            )
+
+    def create(self, users_table, envs_table, field):
+        key_type = field.db_type(self.connection)
+        uuid_type = models.UUIDField().db_type(self.connection)
+        self.run_sql(
+            f"CREATE TABLE {self.qn(users_table)} ("
+            f"id {uuid_type} PRIMARY KEY, email varchar(254) NOT NULL UNIQUE)"
+        )
+        self.run_sql(
+            f"CREATE TABLE {self.qn(envs_table)} ("
+            f"id varchar(26) PRIMARY KEY, name varchar(100) NOT NULL, "
+            f"user_ref {key_type} NOT NULL)"
+        )
+        self.run_sql(
+            f"CREATE INDEX {self.qn(envs_table + '_user')} "
+            f"ON {self.qn(envs_table)} (user_ref)"
+        )
+        self.run_sql(
+            f"CREATE UNIQUE INDEX {self.qn(envs_table + '_name_user')} "
+            f"ON {self.qn(envs_table)} (name, user_ref)"
+        )
+
+    def fill(self, users_table, envs_table, layout, users, envs):
+        with transaction.atomic(using=self.connection.alias):
+            with self.connection.cursor() as cursor:
+                cursor.executemany(
+                    f"INSERT INTO {self.qn(users_table)} (id, email) VALUES (%s, %s)",
+                    [(self.prep(id), email) for id, email in users],
+                )
+                cursor.executemany(
+                    f"INSERT INTO {self.qn(envs_table)} (id, name, user_ref) "
+                    "VALUES (%s, %s, %s)",
+                    [(id, name, self.key(layout, user)) for id, name, user in envs],
+                )
+
+    def measure(self, users_table, envs_table, layout, sample):
+        """Return the total seconds each query took over ``sample``."""
+        users, envs = self.qn(users_table), self.qn(envs_table)
+        queries = {
+            "join": (
+                f"SELECT e.name, u.email FROM {envs} e "
+                f"JOIN {users} u ON u.{layout} = e.user_ref WHERE e.id = %s",
+                lambda id, name, user: [id],
+            ),
+            "list": (
+                f"SELECT id, name FROM {envs} WHERE user_ref = %s",
+                lambda id, name, user: [self.key(layout, user)],
+            ),
+            "name check": (
+                f"SELECT 1 FROM {envs} WHERE name = %s AND user_ref = %s",
+                lambda id, name, user: [name, self.key(layout, user)],
+            ),
+        }
+
+        timings = {}
+        with self.connection.cursor() as cursor:
+            for name, (sql, params) in queries.items():
+                params = [params(*env) for env in sample]
+                start = time.perf_counter()
+                for param in params:
+                    cursor.execute(sql, param)
+                    cursor.fetchall()
+                timings[name] = time.perf_counter() - start
+        return timings
+
+    def key(self, layout, user):
+        id, email = user
+        return email if layout == "email" else self.prep(id)
+
+    def prep(self, id):
+        return models.UUIDField().get_db_prep_value(id, self.connection)
+
+    def qn(self, name):
+        return self.connection.ops.quote_name(name)
+
+    def run_sql(self, sql, params=None):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
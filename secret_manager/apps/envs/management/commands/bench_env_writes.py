@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from secret_manager.apps.envs import crypto
+from secret_manager.apps.envs.models import Env, EnvSecret
+from secret_manager.apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare env writes per second for the rsa and envelope schemes. "
+        "Rows are written inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("-n", "--count", type=int, default=50)
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        for scheme in (crypto.SCHEME_RSA, crypto.SCHEME_ENVELOPE):
+            elapsed = self.run(scheme, count)
+            self.stdout.write(
+                f"{scheme:>8}: {count} writes in {elapsed:.3f}s "
+                f"({count / elapsed:.1f} writes/s)"
+            )
+
+    def run(self, scheme, count):
+        with transaction.atomic():
+            user = User.objects.create(
+                username="bench-env-writes",
+                email="bench-env-writes@example.com",
+                password="",
+            )
+            start = time.perf_counter()
+            for i in range(count):
+                sealed = crypto.encrypt(f"value-{i}", scheme=scheme)
+                secret = EnvSecret.objects.create(
+                    key=sealed.key, scheme=sealed.scheme, key_version=sealed.key_version
+                )
+                Env.objects.create(
+                    name=f"BENCH_{i}", value=sealed.value, user=user, key_id=secret
+                )
+            elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+        return elapsed
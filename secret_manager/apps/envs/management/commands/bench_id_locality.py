@@ -0,0 +1,91 @@
+import time
+from uuid import uuid4
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+
+from secret_manager.apps.envs.management.scratch import format_size, index_size
+from secret_manager.utili import ulid, unique_id, uuid7
+
+GENERATORS = {
+    "unique_id": (unique_id, models.CharField(max_length=26)),
+    "ulid": (ulid, models.CharField(max_length=26)),
+    "uuid4": (uuid4, models.UUIDField()),
+    "uuid7": (uuid7, models.UUIDField()),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Insert the same number of rows into scratch tables keyed by random "
+        "and by time-ordered ids, and compare the insert rate as the table "
+        "grows and the size of the primary key index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=200_000)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            "--ids",
+            nargs="+",
+            choices=list(GENERATORS),
+            default=list(GENERATORS),
+        )
+
+    def handle(self, *args, **options):
+        self.connection = connections[options["database"]]
+        for kind in options["ids"]:
+            generate, field = GENERATORS[kind]
+            table = self.connection.ops.quote_name(f"bench_ids_{kind}")
+            self.run_sql(
+                f"CREATE TABLE {table} "
+                f"(id {field.db_type(self.connection)} PRIMARY KEY, payload varchar(32))"
+            )
+            try:
+                timings = self.fill(table, generate, field, options)
+                index = index_size(self.connection, self.pk_index(f"bench_ids_{kind}"))
+            finally:
+                self.run_sql(f"DROP TABLE {table}")
+
+            tenth = max(len(timings) // 10, 1)
+            self.stdout.write(
+                f"{kind:>10}: {self.rate(timings):8.0f} rows/s  "
+                f"first 10% {self.rate(timings[:tenth]):8.0f} rows/s  "
+                f"last 10% {self.rate(timings[-tenth:]):8.0f} rows/s  "
+                f"pk index {format_size(index)}"
+            )
+
+    def pk_index(self, table):
+        if self.connection.vendor == "sqlite":
+            return f"sqlite_autoindex_{table}_1"
+        return f"{table}_pkey"
+
+    def rate(self, timings):
+        return sum(rows for rows, _ in timings) / sum(seconds for _, seconds in timings)
+
+    def fill(self, table, generate, field, options):
+        """Insert ``--rows`` rows a batch at a time.
+
+        Returns the row count and insert time of every batch; id generation
+        is not timed.
+        """
+        timings = []
+        size = options["batch_size"]
+        for first in range(0, options["rows"], size):
+            rows = [
+                (field.get_db_prep_value(generate(), self.connection), f"payload-{i}")
+                for i in range(first, min(first + size, options["rows"]))
+            ]
+            start = time.perf_counter()
+            with transaction.atomic(using=self.connection.alias):
+                with self.connection.cursor() as cursor:
+                    cursor.executemany(
+                        f"INSERT INTO {table} (id, payload) VALUES (%s, %s)", rows
+                    )
+            timings.append((len(rows), time.perf_counter() - start))
+        return timings
+
+    def run_sql(self, sql, params=None):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
@@ -0,0 +1,75 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+
+from secret_manager.apps.envs import crypto
+from secret_manager.apps.envs import quota as quotas
+from secret_manager.apps.envs.models import Env, EnvSecret
+from secret_manager.apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire parallel get_env requests at a single secret and check that the "
+        "quota is never over-served. Needs a database that allows concurrent "
+        "writers, such as PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--quota", type=int, default=200)
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=32)
+
+    def handle(self, *args, **options):
+        quota = options["quota"]
+        user = User.objects.create(
+            username=f"bench-quota-{random.randbytes(4).hex()}",
+            email=f"bench-quota-{random.randbytes(4).hex()}@example.com",
+            password="",
+        )
+        try:
+            sealed = crypto.encrypt("bench")
+            secret = EnvSecret.objects.create(
+                key=sealed.key, scheme=sealed.scheme, key_version=sealed.key_version
+            )
+            env = Env.objects.create(
+                name="BENCH_QUOTA",
+                value=sealed.value,
+                user=user,
+                key_id=secret,
+                access_password="bench",
+                api_requests=quota,
+            )
+
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+                results = list(
+                    executor.map(lambda _: self.fetch(env.id), range(options["requests"]))
+                )
+
+            if settings.QUOTA_MODE == quotas.MODE_WRITE_BEHIND:
+                quotas.get_counter().flush()
+
+            served = sum(results)
+            remaining = Env.objects.get(id=env.id).api_requests
+            self.stdout.write(
+                f"quota={quota} requests={len(results)} served={served} "
+                f"remaining={remaining}"
+            )
+            expected = min(quota, len(results))
+            if served != expected or remaining != quota - expected:
+                raise CommandError("Quota accounting is not exact")
+        finally:
+            user.delete()
+
+    def fetch(self, key):
+        try:
+            response = Client(HTTP_HOST="localhost").get(
+                "/api/v1/env/get/", {"key": key, "access_password": "bench"}
+            )
+            return response.json()["data"]["value"] == "bench"
+        finally:
+            connection.close()
@@ -0,0 +1,86 @@
+import time
+
+import rsa
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+
+from secret_manager.apps.envs import crypto
+from secret_manager.apps.envs.cache import secret_cache
+from secret_manager.apps.envs.models import Env, EnvSecret
+from secret_manager.apps.users.models import User
+from secret_manager.utili import generate_jwt
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure get_envs_by_user latency against the number of secrets, "
+        "decrypting inline and on the worker pool. Rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--counts", type=int, nargs="+", default=[10, 100, 1000]
+        )
+        parser.add_argument(
+            "--scheme",
+            choices=[crypto.SCHEME_RSA, crypto.SCHEME_ENVELOPE],
+            default=crypto.SCHEME_RSA,
+        )
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        # One keypair is shared by all rsa rows, only decryption is measured
+        keypair = rsa.newkeys(1024) if options["scheme"] == crypto.SCHEME_RSA else None
+
+        for count in options["counts"]:
+            with transaction.atomic():
+                client = self.seed(count, options["scheme"], keypair)
+                with override_settings(DECRYPT_POOL_WORKERS=0):
+                    inline = self.measure(client, options["repeat"])
+                self.measure(client, 1)  # start the worker processes
+                pooled = self.measure(client, options["repeat"])
+                transaction.set_rollback(True)
+            self.stdout.write(
+                f"{count:>6} secrets: inline {inline * 1000:9.1f}ms  "
+                f"pool {pooled * 1000:9.1f}ms"
+            )
+
+    def seed(self, count, scheme, keypair):
+        user = User.objects.create(
+            username="bench-user-envs",
+            email="bench-user-envs@example.com",
+            password="",
+        )
+        for i in range(count):
+            value = f"value-{i}"
+            if keypair:
+                publicKey, privateKey = keypair
+                sealed = crypto.Sealed(
+                    rsa.encrypt(value.encode(), publicKey),
+                    privateKey.save_pkcs1("DER"),
+                    crypto.SCHEME_RSA,
+                    None,
+                )
+            else:
+                sealed = crypto.encrypt(value, scheme=scheme)
+            secret = EnvSecret.objects.create(
+                key=sealed.key, scheme=sealed.scheme, key_version=sealed.key_version
+            )
+            Env.objects.create(
+                name=f"BENCH_{i}", value=sealed.value, user=user, key_id=secret
+            )
+
+        client = Client(HTTP_HOST="localhost")
+        client.cookies["session_token"] = generate_jwt(user)
+        return client
+
+    def measure(self, client, repeat):
+        timings = []
+        for _ in range(repeat):
+            secret_cache.clear()
+            start = time.perf_counter()
+            response = client.get("/api/v1/env/getuserenvs/")
+            timings.append(time.perf_counter() - start)
+            response.json()
+        return min(timings)
@@ -0,0 +1,473 @@
+import io
+import json
+import platform
+import statistics
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+import rsa
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import URLResolver, get_resolver
+from django.utils import timezone
+
+from secret_manager import querybudget
+from secret_manager.apps.envs import crypto, large
+from secret_manager.apps.envs.management.stats import percentile
+from secret_manager.apps.envs.models import Env, EnvSecret
+from secret_manager.apps.users.models import User
+from secret_manager.utili import decode_jwt, generate_jwt
+
+Call = namedtuple("Call", ["method", "path", "body", "token"])
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed benchmark users and envs, drive every route in "
+        "secret_manager/urls.py at the given concurrency and run crypto/auth "
+        "microbenchmarks. Reports throughput and p50/p95/p99 latency, and "
+        "writes JSON with --output. Seeded rows are removed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--envs", type=int, default=20, help="Envs per user")
+        parser.add_argument("--requests", type=int, default=200, help="Per route")
+        parser.add_argument(
+            "--large-bytes",
+            type=int,
+            default=256 * 1024,
+            help="Size of the large secrets uploaded and downloaded",
+        )
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument(
+            "--url",
+            help="Base URL of a running server sharing this database, "
+            "e.g. http://127.0.0.1:8000. Default: in-process test client",
+        )
+        parser.add_argument("--routes", nargs="+", help="Only these routes")
+        parser.add_argument("--micro-iterations", type=int, default=200)
+        parser.add_argument("--keygen-iterations", type=int, default=5)
+        parser.add_argument("--skip-routes", action="store_true")
+        parser.add_argument("--skip-micro", action="store_true")
+        parser.add_argument("--output", help="Write the results as JSON here")
+        parser.add_argument("--keep", action="store_true", help="Keep seeded rows")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["envs"] < 1:
+            raise CommandError("--users and --envs must be at least 1")
+        self.options = options
+        self.prefix = f"bench-{uuid.uuid4().hex[:6]}"
+        results = {"meta": self.meta(), "routes": {}, "micro": {}}
+
+        if not options["skip_routes"]:
+            admin_existed = User.objects.filter(username="admin").exists()
+            self.seed()
+            try:
+                # The query budget checks are for development, not timing
+                with override_settings(QUERY_BUDGETS=querybudget.MODE_OFF):
+                    results["routes"] = self.run_routes()
+            finally:
+                if not options["keep"]:
+                    self.cleanup(admin_existed)
+
+        if not options["skip_micro"]:
+            results["micro"] = self.run_micro()
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def meta(self):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "HEAD"],
+                capture_output=True,
+                text=True,
+                cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except OSError:
+            commit = None
+        return {
+            "time": timezone.now().isoformat(),
+            "commit": commit or None,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "encryption_scheme": settings.ENV_ENCRYPTION_SCHEME,
+            "async_views": settings.ASYNC_VIEWS,
+            "target": self.options["url"] or "in-process",
+            **{
+                name: self.options[name]
+                for name in ("users", "envs", "requests", "concurrency")
+            },
+        }
+
+    # Seeding
+
+    def seed(self):
+        start = time.perf_counter()
+        count = self.options["requests"]
+        password = make_password("bench")
+
+        def users(kind, n, role="user"):
+            return User.objects.bulk_create(
+                User(
+                    username=f"{self.prefix}-{kind}-{i}",
+                    email=f"{self.prefix}-{kind}-{i}@example.com",
+                    password=password,
+                    role=role,
+                    lastLogin=timezone.now(),
+                )
+                for i in range(n)
+            )
+
+        self.users = users("user", self.options["users"])
+        self.admin = users("admin", 1, role="admin")[0]
+        # Rows the delete routes use up, one per request
+        self.deletable_users = users("gone", count)
+
+        self.envs = self.seed_envs(self.users, self.options["envs"])
+        self.deletable_envs = self.seed_envs([self.admin], count, name="GONE")
+        self.large_envs = self.seed_large_envs(self.users)
+
+        self.tokens = {user.id: generate_jwt(user) for user in self.users}
+        self.admin_token = generate_jwt(self.admin)
+        self.stdout.write(
+            f"Seeded {len(self.users) + len(self.deletable_users) + 1} users and "
+            f"{len(self.envs) + len(self.deletable_envs)} envs "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+
+    def seed_envs(self, users, per_user, name="BENCH"):
+        secrets, envs = [], []
+        for user in users:
+            for i in range(per_user):
+                sealed = crypto.encrypt(f"value-{i}")
+                secret = EnvSecret(
+                    key=sealed.key, scheme=sealed.scheme, key_version=sealed.key_version
+                )
+                secrets.append(secret)
+                envs.append(
+                    Env(
+                        name=f"{name}_{i}",
+                        value=sealed.value,
+                        user=user,
+                        key_id=secret,
+                        access_password=uuid.uuid4().hex[:8],
+                        api_requests=10**9,
+                    )
+                )
+        EnvSecret.objects.bulk_create(secrets, batch_size=500)
+        return Env.objects.bulk_create(envs, batch_size=500)
+
+    def seed_large_envs(self, users):
+        size = self.options["large_bytes"]
+        return [
+            large.store(
+                Env(
+                    name="BENCH_LARGE",
+                    user=user,
+                    access_password=uuid.uuid4().hex[:8],
+                    api_requests=10**9,
+                ),
+                io.BytesIO(b"x" * size),
+                size,
+            )
+            for user in users
+        ]
+
+    def cleanup(self, admin_existed):
+        EnvSecret.objects.filter(env__user__username__startswith=self.prefix).delete()
+        User.objects.filter(username__startswith=self.prefix).delete()
+        User.objects.filter(email__startswith=self.prefix).delete()
+        if not admin_existed:
+            User.objects.filter(username="admin").delete()
+
+    # Routes
+
+    def routes(self):
+        def walk(patterns, prefix):
+            for pattern in patterns:
+                if isinstance(pattern, URLResolver):
+                    yield from walk(pattern.url_patterns, prefix + str(pattern.pattern))
+                else:
+                    yield prefix + str(pattern.pattern)
+
+        return [r for r in walk(get_resolver().url_patterns, "") if not r.startswith("admin/")]
+
+    def scenarios(self):
+        """Return ``{route: f(i) -> Call}`` for every route that is driven."""
+        users, envs = self.users, self.envs
+        per_user = self.options["envs"]
+
+        def user(i):
+            return users[i % len(users)]
+
+        def token(i):
+            return self.tokens[user(i).id]
+
+        def env(i):
+            return envs[i % len(envs)]
+
+        def owner_token(i):
+            # Envs were seeded user by user
+            return self.tokens[users[(i % len(envs)) // per_user].id]
+
+        def env_get(i):
+            return f"/api/v1/env/get/?key={env(i).id}&access_password={env(i).access_password}"
+
+        def batch(i):
+            items = [envs[(i + j) % len(envs)] for j in range(10)]
+            return {
+                "items": [{"key": e.id, "access_password": e.access_password} for e in items]
+            }
+
+        def large_env(i):
+            return self.large_envs[i % len(self.large_envs)]
+
+        def name(kind, i):
+            return f"{self.prefix}-{kind}-{i}-{uuid.uuid4().hex[:6]}"
+
+        def import_body(i):
+            # Every seeded env of the user, changed on every other request,
+            # and as many new ones
+            lines = [f"BENCH_{j}=import-{i // len(users) % 2}" for j in range(per_user)]
+            lines += [f"{name('IMPORT', i)}=v{j}" for j in range(per_user)]
+            return "\n".join(lines).encode()
+
+        return {
+            "": lambda i: Call("GET", "/", None, None),
+            "healthz": lambda i: Call("GET", "/healthz", None, None),
+            "readyz": lambda i: Call("GET", "/readyz", None, None),
+            "metrics": lambda i: Call("GET", "/metrics", None, None),
+            "profiles/": lambda i: Call("GET", "/profiles/", None, self.admin_token),
+            "profiles/<str:name>": lambda i: Call(
+                "GET", "/profiles/missing", None, self.admin_token
+            ),
+            "api/v1/user/register/": lambda i: Call(
+                "POST",
+                "/api/v1/user/register/",
+                {"username": name("reg", i), "email": f"{name('reg', i)}@example.com", "password": "bench"},
+                None,
+            ),
+            "api/v1/user/getuser/": lambda i: Call("GET", "/api/v1/user/getuser/", None, token(i)),
+            "api/v1/user/login/": lambda i: Call(
+                "POST", "/api/v1/user/login/", {"email": user(i).email, "password": "bench"}, None
+            ),
+            "api/v1/user/logout/": lambda i: Call(
+                "POST", "/api/v1/user/logout/", None, generate_jwt(user(i))
+            ),
+            "api/v1/user/updateuser/": lambda i: Call(
+                "PUT", "/api/v1/user/updateuser/", {"firstname": f"Bench {i}"}, token(i)
+            ),
+            "api/v1/user/deleteuser/": lambda i: Call(
+                "DELETE",
+                f"/api/v1/user/deleteuser/?id={self.deletable_users[i].id}",
+                None,
+                None,
+            ),
+            "api/v1/user/getusers/": lambda i: Call("GET", "/api/v1/user/getusers/", None, None),
+            "api/v1/user/setadmin/": lambda i: Call("POST", "/api/v1/user/setadmin/", None, None),
+            "api/v1/user/setmoderator/": lambda i: Call(
+                "POST",
+                f"/api/v1/user/setmoderator/?email={name('mod', i)}@example.com",
+                None,
+                None,
+            ),
+            "api/v1/user/refresh/": lambda i: Call("GET", "/api/v1/user/refresh/", None, token(i)),
+            "api/v1/env/getenvs/": lambda i: Call("GET", "/api/v1/env/getenvs/", None, None),
+            "api/v1/env/add/": lambda i: Call(
+                "POST", "/api/v1/env/add/", {"name": name("ADD", i), "value": f"v{i}"}, token(i)
+            ),
+            "api/v1/env/get/": lambda i: Call("GET", env_get(i), None, None),
+            "api/v1/env/batchget/": lambda i: Call("POST", "/api/v1/env/batchget/", batch(i), None),
+            "api/v1/env/upload/": lambda i: Call(
+                "POST",
+                f"/api/v1/env/upload/?name={name('UPLOAD', i)}",
+                b"x" * self.options["large_bytes"],
+                token(i),
+            ),
+            "api/v1/env/download/": lambda i: Call(
+                "GET",
+                f"/api/v1/env/download/?key={large_env(i).id}"
+                f"&access_password={large_env(i).access_password}",
+                None,
+                None,
+            ),
+            "api/v1/env/import/": lambda i: Call(
+                "POST", "/api/v1/env/import/", import_body(i), token(i)
+            ),
+            "api/v1/env/update/": lambda i: Call(
+                "PUT",
+                "/api/v1/env/update/",
+                {"id": env(i).id, "value": f"updated-{i}"},
+                owner_token(i),
+            ),
+            "api/v1/env/delete/": lambda i: Call(
+                "DELETE",
+                f"/api/v1/env/delete/?id={self.deletable_envs[i].id}",
+                None,
+                self.admin_token,
+            ),
+            "api/v1/env/getuserenvs/": lambda i: Call(
+                "GET", "/api/v1/env/getuserenvs/", None, token(i)
+            ),
+            "api/v1/env/accesspassword/": lambda i: Call(
+                "PUT",
+                "/api/v1/env/accesspassword/",
+                {"name": f"BENCH_{i % per_user}"},
+                token(i),
+            ),
+            "api/v1/env/stats/": lambda i: Call("GET", "/api/v1/env/stats/", None, self.admin_token),
+        }
+
+    def run_routes(self):
+        scenarios = self.scenarios()
+        routes = self.options["routes"] or self.routes()
+        unknown = [route for route in routes if route not in scenarios]
+        if unknown:
+            raise CommandError(f"No benchmark scenario for: {', '.join(unknown)}")
+
+        results = {}
+        self.stdout.write(
+            f"{'route':<30} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}  statuses"
+        )
+        for route in routes:
+            results[route] = self.drive(scenarios[route])
+            r = results[route]
+            self.stdout.write(
+                f"{'/' + route:<30} {r['throughput']:>8.1f} {r['p50_ms']:>7.2f}ms "
+                f"{r['p95_ms']:>7.2f}ms {r['p99_ms']:>7.2f}ms  {r['statuses']}"
+            )
+        return results
+
+    def drive(self, scenario):
+        local = threading.local()
+        send = self.send_http if self.options["url"] else self.send_local
+
+        def one(i):
+            call = scenario(i)
+            start = time.perf_counter()
+            status = send(local, call)
+            return status, time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.options["concurrency"]) as pool:
+            outcomes = list(pool.map(one, range(self.options["requests"])))
+        elapsed = time.perf_counter() - start
+
+        timings = [t for _, t in outcomes]
+        return {
+            "requests": len(outcomes),
+            "throughput": len(outcomes) / elapsed,
+            "mean_ms": statistics.fmean(timings) * 1000,
+            "p50_ms": percentile(timings, 50) * 1000,
+            "p95_ms": percentile(timings, 95) * 1000,
+            "p99_ms": percentile(timings, 99) * 1000,
+            "statuses": dict(Counter(str(status) for status, _ in outcomes)),
+        }
+
+    def send_local(self, local, call):
+        if not hasattr(local, "client"):
+            local.client = Client(HTTP_HOST="localhost")
+        extra = {"HTTP_COOKIE": f"session_token={call.token}"} if call.token else {}
+        body, content_type = self.encode_body(call.body)
+        response = local.client.generic(
+            call.method, call.path, body or "", content_type=content_type, **extra
+        )
+        if response.streaming:
+            b"".join(response)
+        return response.status_code
+
+    def encode_body(self, body):
+        """Bytes are sent as they are, anything else as JSON."""
+        if isinstance(body, bytes):
+            return body, "application/octet-stream"
+        if body is None:
+            return None, "application/json"
+        return json.dumps(body).encode(), "application/json"
+
+    def send_http(self, local, call):
+        body, content_type = self.encode_body(call.body)
+        request = urllib.request.Request(
+            self.options["url"].rstrip("/") + call.path,
+            data=body,
+            method=call.method,
+            headers={"Content-Type": content_type},
+        )
+        if call.token:
+            request.add_header("Cookie", f"session_token={call.token}")
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+    # Microbenchmarks
+
+    def run_micro(self):
+        iterations = self.options["micro_iterations"]
+        value = "x" * 64
+        public_key, private_key = rsa.newkeys(1024)
+        rsa_sealed = crypto.Sealed(
+            rsa.encrypt(value.encode(), public_key),
+            private_key.save_pkcs1("DER"),
+            crypto.SCHEME_RSA,
+            None,
+        )
+        envelope_sealed = crypto.encrypt(value, scheme=crypto.SCHEME_ENVELOPE)
+        token = generate_jwt(
+            User(id=uuid.uuid4(), username="bench", email="bench@example.com")
+        )
+
+        benchmarks = {
+            "rsa.newkeys(1024)": (
+                lambda: rsa.newkeys(1024),
+                self.options["keygen_iterations"],
+            ),
+            "encrypt[rsa]": (lambda: rsa.encrypt(value.encode(), public_key), iterations),
+            "decrypt[rsa]": (lambda: crypto.decrypt(*rsa_sealed), iterations),
+            "encrypt[envelope]": (
+                lambda: crypto.encrypt(value, scheme=crypto.SCHEME_ENVELOPE),
+                iterations,
+            ),
+            "decrypt[envelope]": (lambda: crypto.decrypt(*envelope_sealed), iterations),
+            "decode_jwt": (lambda: decode_jwt(token), iterations),
+            "make_password": (lambda: make_password("bench"), max(1, iterations // 20)),
+        }
+
+        results = {}
+        for name, (fn, count) in benchmarks.items():
+            fn()  # warm up
+            timings = []
+            for _ in range(count):
+                start = time.perf_counter()
+                fn()
+                timings.append(time.perf_counter() - start)
+            results[name] = {
+                "iterations": count,
+                "ops_per_sec": count / sum(timings),
+                "mean_ms": statistics.fmean(timings) * 1000,
+                "p50_ms": percentile(timings, 50) * 1000,
+                "p95_ms": percentile(timings, 95) * 1000,
+                "p99_ms": percentile(timings, 99) * 1000,
+            }
+            self.stdout.write(
+                f"{name:<20} {results[name]['ops_per_sec']:>10.1f} ops/s  "
+                f"p50 {results[name]['p50_ms']:.3f}ms  p99 {results[name]['p99_ms']:.3f}ms"
+            )
+        return results
@@ -0,0 +1,204 @@
+import io
+import json
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from secret_manager import querybudget
+from secret_manager.apps.envs import crypto, importer, large
+from secret_manager.apps.envs import urls as env_urls
+from secret_manager.apps.envs.cache import secret_cache
+from secret_manager.apps.envs.models import Env, EnvSecret
+from secret_manager.apps.users import urls as user_urls
+from secret_manager.apps.users.models import User
+from secret_manager.auth import principal_cache
+from secret_manager.revocation import revocations
+from secret_manager.utili import generate_jwt
+
+
+class Command(BaseCommand):
+    help = (
+        "Call every env and user API route with cold caches and check the "
+        "queries it runs against its @query_budget and for N+1 patterns. "
+        "Rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--envs",
+            type=int,
+            default=10,
+            help="Envs per user, enough to make an N+1 stand out",
+        )
+
+    def handle(self, *args, **options):
+        patterns = {
+            p.name: p for p in env_urls.urlpatterns + user_urls.urlpatterns
+        }
+        problems = []
+
+        # Record here rather than in the middleware
+        with override_settings(QUERY_BUDGETS=querybudget.MODE_OFF):
+            with transaction.atomic():
+                calls = self.scenario(options["envs"])
+                missing = set(patterns) - {name for name, *_ in calls}
+                problems += [f"{name}: not exercised" for name in sorted(missing)]
+
+                for name, client, method, path, data in calls:
+                    view = patterns[name].callback
+                    if getattr(view, "query_budget", None) is None:
+                        problems.append(f"{name}: no @query_budget")
+
+                    statements, status = self.call(client, method, path, data)
+                    # An error path makes fewer queries than the route does
+                    if not 200 <= status < 300:
+                        problems.append(f"{name}: responded {status}")
+                    found = querybudget.violations(view, statements)
+                    problems += [f"{name}: {problem}" for problem in found]
+                    self.stdout.write(
+                        f"{name:>16} {method:<6} {status}  "
+                        f"{len(statements):>3} queries  "
+                        f"budget {getattr(view, 'query_budget', '-')}"
+                    )
+                transaction.set_rollback(True)
+
+        if problems:
+            raise CommandError("\n".join(problems))
+        self.stdout.write(self.style.SUCCESS("All routes are within budget"))
+
+    def call(self, client, method, path, data):
+        principal_cache.clear()
+        secret_cache.clear()
+        revocations.expire()
+
+        token = querybudget.start_recording()
+        try:
+            if isinstance(data, bytes):
+                body, content_type = data, "application/octet-stream"
+            else:
+                body = json.dumps(data) if data is not None else ""
+                content_type = "application/json"
+            response = client.generic(method, path, body, content_type=content_type)
+            if response.streaming:
+                # Also drains the async iterators of the async views
+                b"".join(response)
+        finally:
+            statements = querybudget.stop_recording(token)
+        return statements, response.status_code
+
+    def scenario(self, env_count):
+        owner = self.user("budget-owner", role="admin")
+        other = self.user("budget-other")
+        envs = [self.env(owner, i) for i in range(env_count)]
+        for i in range(env_count):
+            self.env(other, i)
+
+        client = self.client(owner)
+        anonymous = Client(HTTP_HOST="localhost")
+        batch = [{"key": env.id, "access_password": env.access_password} for env in envs]
+        big = self.large_env(owner)
+        stream = f"?stream=json&limit={env_count}"
+        # Unchanged, updated and large envs, and more new ones than one INSERT takes
+        imported = {
+            envs[4].name: "value-4",
+            envs[5].name: "v2",
+            big.name: "v2",
+            **{f"BUDGET_IMPORT_{i}": "v" for i in range(importer.WRITE_BATCH + 1)},
+        }
+        dotenv = "".join(f"{name}=v3\n" for name in imported).encode()
+
+        return [
+            ("getenvs", anonymous, "GET", "/api/v1/env/getenvs/", None),
+            ("getenvs", anonymous, "GET", f"/api/v1/env/getenvs/{stream}", None),
+            ("addenv", client, "POST", "/api/v1/env/add/", {"name": "BUDGET_NEW", "value": "v"}),
+            (
+                "getenv",
+                anonymous,
+                "GET",
+                f"/api/v1/env/get/?key={envs[0].id}&access_password={envs[0].access_password}",
+                None,
+            ),
+            ("batchgetenv", anonymous, "POST", "/api/v1/env/batchget/", {"items": batch}),
+            (
+                "uploadenv",
+                client,
+                "POST",
+                "/api/v1/env/upload/?name=BUDGET_LARGE_NEW",
+                b"x" * (large.WRITE_BATCH + 1) * settings.LARGE_SECRET_CHUNK_SIZE,
+            ),
+            (
+                "downloadenv",
+                anonymous,
+                "GET",
+                f"/api/v1/env/download/?key={big.id}&access_password={big.access_password}",
+                None,
+            ),
+            ("getuserenvs", client, "GET", "/api/v1/env/getuserenvs/", None),
+            ("getuserenvs", client, "GET", "/api/v1/env/getuserenvs/?stream=ndjson", None),
+            ("updateenv", client, "PUT", "/api/v1/env/update/", {"id": envs[1].id, "value": "v2"}),
+            ("accesspassword", client, "PUT", "/api/v1/env/accesspassword/", {"name": envs[2].name}),
+            ("envstats", client, "GET", "/api/v1/env/stats/", None),
+            ("deleteenv", client, "DELETE", f"/api/v1/env/delete/?id={envs[3].id}", None),
+            ("importenvs", client, "POST", "/api/v1/env/import/", imported),
+            ("importenvs", client, "POST", "/api/v1/env/import/", dotenv),
+            (
+                "register",
+                anonymous,
+                "POST",
+                "/api/v1/user/register/",
+                {"username": "budget-new", "email": "budget-new@example.com", "password": "pw"},
+            ),
+            ("login", anonymous, "POST", "/api/v1/user/login/", {"email": owner.email, "password": "pw"}),
+            ("getuser", client, "GET", "/api/v1/user/getuser/", None),
+            ("getusers", anonymous, "GET", "/api/v1/user/getusers/", None),
+            ("getusers", anonymous, "GET", "/api/v1/user/getusers/?stream=ndjson", None),
+            ("updateuser", client, "PUT", "/api/v1/user/updateuser/", {"firstname": "Budget"}),
+            ("refresh", client, "GET", "/api/v1/user/refresh/", None),
+            ("setadmin", anonymous, "POST", "/api/v1/user/setadmin/", None),
+            (
+                "setmoderator",
+                anonymous,
+                "POST",
+                "/api/v1/user/setmoderator/?email=budget-mod@example.com",
+                None,
+            ),
+            ("deleteuser", anonymous, "DELETE", f"/api/v1/user/deleteuser/?id={other.id}", None),
+            ("logout", self.client(owner), "POST", "/api/v1/user/logout/", None),
+        ]
+
+    def user(self, name, role="user"):
+        return User.objects.create(
+            username=name,
+            email=f"{name}@example.com",
+            password=make_password("pw"),
+            role=role,
+            lastLogin=timezone.now(),
+        )
+
+    def env(self, user, i):
+        sealed = crypto.encrypt(f"value-{i}", scheme=crypto.SCHEME_ENVELOPE)
+        secret = EnvSecret.objects.create(
+            key=sealed.key, scheme=sealed.scheme, key_version=sealed.key_version
+        )
+        return Env.objects.create(
+            name=f"BUDGET_{i}",
+            value=sealed.value,
+            user=user,
+            key_id=secret,
+            access_password=f"pw{i}",
+        )
+
+    def large_env(self, user):
+        # Enough chunks for the download to take several fetches
+        size = (large.READ_BATCH * 2 + 1) * settings.LARGE_SECRET_CHUNK_SIZE
+        env = Env(name="BUDGET_LARGE", user=user, access_password="pw-large")
+        return large.store(env, io.BytesIO(b"x" * size), size)
+
+    def client(self, user):
+        client = Client(HTTP_HOST="localhost")
+        client.cookies["session_token"] = generate_jwt(user)
+        return client
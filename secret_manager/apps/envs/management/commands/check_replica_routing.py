@@ -0,0 +1,136 @@
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, override_settings
+
+from secret_manager.apps.envs.models import Env
+from secret_manager.db_router import PRIMARY_COOKIE, pinned, read_your_writes_middleware
+
+# Stand-in replica alias, only ever returned by the router, never connected to
+REPLICA = "replica_check"
+
+
+def reads_and_writes(steps):
+    """Build a view that runs ``steps`` and records where each one is routed.
+
+    Steps are "read", "write", "atomic read" (a read inside a transaction)
+    or "streamed read", a read bound with ``pinned`` and only routed when the
+    streaming response it returns is consumed, after the middleware.
+    """
+
+    def route(step):
+        if step == "write":
+            return router.db_for_write(Env)
+        if step == "atomic read":
+            with transaction.atomic():
+                return router.db_for_read(Env)
+        return router.db_for_read(Env)
+
+    def streamed(queryset):
+        yield queryset.db
+
+    def view(request):
+        request.routed = [route(step) for step in steps if step != "streamed read"]
+        if "streamed read" in steps:
+            return StreamingHttpResponse(streamed(pinned(Env.objects.all())))
+        return HttpResponse()
+
+    async def aview(request):
+        # Routing state must reach ORM calls made from a thread
+        return await sync_to_async(view)(request)
+
+    return view, aview
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive read_your_writes_middleware with a stand-in replica and check "
+        "where reads and writes go: reads to the replica, everything to the "
+        "primary for writing methods, after a write and inside transactions, "
+        "and the cookie that keeps a client on the primary after it wrote."
+    )
+
+    def handle(self, *args, **options):
+        primary, replica = DEFAULT_DB_ALIAS, REPLICA
+        factory = RequestFactory()
+        # (description, method, cookie, steps, expected routes, expect cookie)
+        cases = [
+            ("GET reads from the replica", "get", None, ["read"], [replica], False),
+            (
+                "GET reads from the primary after writing in passing",
+                "get",
+                None,
+                ["read", "write", "read"],
+                [replica, primary, primary],
+                False,
+            ),
+            (
+                "GET reads inside a transaction from the primary",
+                "get",
+                None,
+                ["atomic read", "read"],
+                [primary, replica],
+                False,
+            ),
+            (
+                "POST reads from the primary before its first write",
+                "post",
+                None,
+                ["read", "write", "read"],
+                [primary, primary, primary],
+                True,
+            ),
+            ("PUT reads from the primary", "put", None, ["read", "write"], [primary, primary], True),
+            ("DELETE reads from the primary", "delete", None, ["read"], [primary], False),
+            ("GET after a write reads from the primary", "get", "after write", ["read"], [primary], False),
+            (
+                "GET after a write streams from the primary",
+                "get",
+                "after write",
+                ["streamed read"],
+                [primary],
+                False,
+            ),
+            ("GET streams from the replica", "get", None, ["streamed read"], [replica], False),
+            ("GET with an expired cookie reads from the replica", "get", "1", ["read"], [replica], False),
+            ("GET with a broken cookie reads from the replica", "get", "x", ["read"], [replica], False),
+        ]
+
+        problems = []
+        with override_settings(REPLICA_DATABASES=[REPLICA]):
+            cookie = None
+            for asynchronous in (False, True):
+                for description, method, sent, steps, expected, sets_cookie in cases:
+                    if sent == "after write":
+                        sent = cookie
+                    request = getattr(factory, method)("/")
+                    if sent is not None:
+                        request.COOKIES[PRIMARY_COOKIE] = sent
+
+                    view, aview = reads_and_writes(steps)
+                    if asynchronous:
+                        response = async_to_sync(read_your_writes_middleware(aview))(request)
+                    else:
+                        response = read_your_writes_middleware(view)(request)
+
+                    if response.streaming:
+                        request.routed += [alias.decode() for alias in response.streaming_content]
+
+                    set_cookie = response.cookies.get(PRIMARY_COOKIE)
+                    if set_cookie is not None:
+                        cookie = set_cookie.value
+                    label = f"{'async' if asynchronous else 'sync'}: {description}"
+                    if request.routed != expected:
+                        problems.append(f"{label}: routed {request.routed}, expected {expected}")
+                    elif (set_cookie is not None) != sets_cookie:
+                        problems.append(
+                            f"{label}: {'set' if set_cookie is not None else 'no'} "
+                            f"{PRIMARY_COOKIE} cookie"
+                        )
+                    else:
+                        self.stdout.write(f"ok  {label}")
+
+        if problems:
+            raise CommandError("\n".join(problems))
+        self.stdout.write(self.style.SUCCESS("Reads and writes are routed as expected"))
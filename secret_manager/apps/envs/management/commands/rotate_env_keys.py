@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from secret_manager.apps.envs import crypto
+from secret_manager.apps.envs.models import Env, EnvSecret
+
+
+class Command(BaseCommand):
+    help = (
+        "Rewrap envelope data keys with the current master key version and, "
+        "with --convert-rsa, re-encrypt legacy RSA secrets with envelope keys."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--convert-rsa",
+            action="store_true",
+            help="Also move rows still using the per-secret RSA scheme",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        version = crypto.current_key_version()
+
+        rewrapped = self.rewrap(version, batch_size)
+        self.stdout.write(f"Rewrapped {rewrapped} data keys to version {version}")
+
+        if options["convert_rsa"]:
+            converted = self.convert_rsa(batch_size)
+            self.stdout.write(f"Converted {converted} RSA secrets to envelope")
+
+    def rewrap(self, version, batch_size):
+        # Only the wrapped data key changes, env values stay untouched
+        count = 0
+        while True:
+            with transaction.atomic():
+                secrets = list(
+                    EnvSecret.objects.select_for_update()
+                    .filter(scheme=crypto.SCHEME_ENVELOPE)
+                    .exclude(key_version=version)[:batch_size]
+                )
+                if not secrets:
+                    return count
+                for secret in secrets:
+                    data_key = crypto.unwrap_data_key(secret.key, secret.key_version)
+                    secret.key, secret.key_version = crypto.wrap_data_key(
+                        data_key, version
+                    )
+                EnvSecret.objects.bulk_update(secrets, ["key", "key_version"])
+            count += len(secrets)
+
+    def convert_rsa(self, batch_size):
+        count = 0
+        while True:
+            with transaction.atomic():
+                envs = list(
+                    Env.objects.select_for_update()
+                    .select_related("key_id")
+                    .filter(key_id__scheme=crypto.SCHEME_RSA)[:batch_size]
+                )
+                if not envs:
+                    return count
+                secrets = []
+                for env in envs:
+                    sealed = crypto.encrypt(
+                        crypto.decrypt_env(env), scheme=crypto.SCHEME_ENVELOPE
+                    )
+                    secret = env.key_id
+                    secret.key = sealed.key
+                    secret.scheme = sealed.scheme
+                    secret.key_version = sealed.key_version
+                    env.value = sealed.value
+                    secrets.append(secret)
+                EnvSecret.objects.bulk_update(secrets, ["key", "scheme", "key_version"])
+                Env.objects.bulk_update(envs, ["value"])
+            count += len(envs)
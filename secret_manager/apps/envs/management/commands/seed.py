@@ -0,0 +1,181 @@
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from secret_manager.apps.envs import crypto, keypool, workers
+from secret_manager.apps.envs.models import Env, EnvSecret
+from secret_manager.apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Load synthetic users and envs with valid encryption for scale "
+        "testing. Values are encrypted on a process pool while the previous "
+        "batch is written with bulk_create, or COPY on PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--envs-per-user", type=int, default=10)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=multiprocessing.cpu_count(),
+            help="Encryption processes, 0 to encrypt inline",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--scheme",
+            choices=[crypto.SCHEME_RSA, crypto.SCHEME_ENVELOPE],
+            default=settings.ENV_ENCRYPTION_SCHEME,
+        )
+        parser.add_argument(
+            "--prefix",
+            default="seed",
+            help="Usernames are <prefix>-<n>, pick a new one for every load",
+        )
+        parser.add_argument("--password", default="seed")
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            help="Load with COPY instead of bulk_create (PostgreSQL only)",
+        )
+
+    def handle(self, *args, **options):
+        if options["copy"] and connection.vendor != "postgresql":
+            raise CommandError("--copy needs PostgreSQL")
+        if User.objects.filter(username__startswith=f"{options['prefix']}-").exists():
+            raise CommandError(f"Users with prefix {options['prefix']!r} already exist")
+
+        self.options = options
+        start = time.perf_counter()
+        user_ids = self.seed_users()
+        self.stdout.write(
+            f"{len(user_ids)} users in {time.perf_counter() - start:.1f}s"
+        )
+
+        start = time.perf_counter()
+        count = self.seed_envs(user_ids)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{count} envs ({options['scheme']}) in {elapsed:.1f}s, "
+                f"{count / elapsed:.0f} envs/s"
+            )
+        )
+
+    def seed_users(self):
+        options = self.options
+        # Every seeded user shares one password, hashing it per row would
+        # dominate the load
+        password = make_password(options["password"])
+        now = timezone.now()
+        user_ids = []
+        for first in range(0, options["users"], options["batch_size"]):
+            users = [
+                User(
+                    username=f"{options['prefix']}-{i}",
+                    email=f"{options['prefix']}-{i}@example.com",
+                    password=password,
+                    lastLogin=now,
+                )
+                for i in range(first, min(first + options["batch_size"], options["users"]))
+            ]
+            self.write(User, users)
+            user_ids += [user.id for user in users]
+        return user_ids
+
+    def seed_envs(self, user_ids):
+        options = self.options
+        per_user = options["envs_per_user"]
+        total = len(user_ids) * per_user
+        batches = (
+            range(first, min(first + options["batch_size"], total))
+            for first in range(0, total, options["batch_size"])
+        )
+
+        def values(batch):
+            return [f"seed-value-{i}" for i in batch]
+
+        written = 0
+        if options["workers"] <= 0:
+            for batch in batches:
+                sealed = workers.seal_chunk(values(batch), options["scheme"])
+                written += self.write_envs(user_ids, batch, sealed)
+            return written
+
+        with ProcessPoolExecutor(
+            max_workers=options["workers"],
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=keypool.generate_inline,
+        ) as pool:
+            # Each batch is split over the workers; the next batch is
+            # encrypted while the current one is written
+            pending = None
+            for batch in batches:
+                futures = self.submit(pool, batch, values(batch))
+                if pending:
+                    written += self.collect(user_ids, *pending)
+                pending = (batch, futures)
+            if pending:
+                written += self.collect(user_ids, *pending)
+        return written
+
+    def submit(self, pool, batch, values):
+        size = -(-len(values) // self.options["workers"])
+        return [
+            pool.submit(workers.seal_chunk, values[i : i + size], self.options["scheme"])
+            for i in range(0, len(values), size)
+        ]
+
+    def collect(self, user_ids, batch, futures):
+        sealed = [seal for future in futures for seal in future.result()]
+        written = self.write_envs(user_ids, batch, sealed)
+        self.stdout.write(f"  {batch[-1] + 1} envs written")
+        return written
+
+    def write_envs(self, user_ids, batch, sealed):
+        per_user = self.options["envs_per_user"]
+        secrets, envs = [], []
+        for i, seal in zip(batch, sealed):
+            secret = EnvSecret(key=seal.key, scheme=seal.scheme, key_version=seal.key_version)
+            secrets.append(secret)
+            envs.append(
+                Env(
+                    name=f"SEED_{i % per_user}",
+                    value=seal.value,
+                    user_id=user_ids[i // per_user],
+                    key_id=secret,
+                    access_password=random.randbytes(4).hex(),
+                )
+            )
+        with transaction.atomic():
+            self.write(EnvSecret, secrets)
+            self.write(Env, envs)
+        return len(envs)
+
+    def write(self, model, objs):
+        if not self.options["copy"]:
+            model.objects.bulk_create(objs, batch_size=self.options["batch_size"])
+            return
+
+        fields = [f for f in model._meta.concrete_fields]
+        for obj in objs:
+            for field in fields:
+                # Fills auto_now dates, the same as bulk_create does
+                field.pre_save(obj, add=True)
+        columns = ", ".join(connection.ops.quote_name(f.column) for f in fields)
+        table = connection.ops.quote_name(model._meta.db_table)
+        with connection.cursor() as cursor:
+            with cursor.cursor.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+                for obj in objs:
+                    copy.write_row(
+                        [f.get_db_prep_value(f.value_from_object(obj), connection) for f in fields]
+                    )
@@ -0,0 +1,33 @@
+"""Helpers of the benchmark commands that work on scratch tables."""
+
+
+def index_size(connection, name):
+    """Return the size in bytes of index ``name``, ``None`` if unknown."""
+    return _relation_size(connection, name, "pg_relation_size")
+
+
+def table_size(connection, name):
+    """Return the size in bytes of table ``name`` without its indexes.
+
+    On PostgreSQL this includes the TOAST table holding large values.
+    """
+    return _relation_size(connection, name, "pg_table_size")
+
+
+def _relation_size(connection, name, pg_function):
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(f"SELECT {pg_function}(%s::regclass)", [name])
+            return cursor.fetchone()[0]
+        if connection.vendor == "sqlite":
+            try:
+                cursor.execute("SELECT sum(pgsize) FROM dbstat WHERE name = %s", [name])
+            except Exception:
+                # SQLite built without the dbstat table
+                return None
+            return cursor.fetchone()[0]
+    return None
+
+
+def format_size(size):
+    return "n/a" if size is None else f"{size / 1024 / 1024:.1f} MiB"
@@ -0,0 +1,7 @@
+"""Helpers of the benchmark commands that summarize timings."""
+
+
+def percentile(timings, percent):
+    """Return the ``percent`` percentile of ``timings``, nearest rank."""
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, len(ordered) * percent // 100)]
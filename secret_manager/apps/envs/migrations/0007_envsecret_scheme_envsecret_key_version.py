@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('envs', '0006_alter_env_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='envsecret',
+            name='scheme',
+            field=models.CharField(choices=[('rsa', 'RSA'), ('envelope', 'Envelope')], default='rsa', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='envsecret',
+            name='key_version',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
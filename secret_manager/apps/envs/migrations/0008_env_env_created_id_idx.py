@@ -0,0 +1,17 @@
+# Generated by Django 5.1 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('envs', '0007_envsecret_scheme_envsecret_key_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='env',
+            index=models.Index(fields=['createdAt', 'id'], name='env_created_id_idx'),
+        ),
+    ]
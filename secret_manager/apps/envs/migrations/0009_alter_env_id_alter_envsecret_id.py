@@ -0,0 +1,24 @@
+# Generated by Django 5.1 on 2026-10-18 20:05
+
+import secret_manager.utili
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('envs', '0008_env_env_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='env',
+            name='id',
+            field=models.CharField(default=secret_manager.utili.ulid, editable=False, max_length=26, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='envsecret',
+            name='id',
+            field=models.UUIDField(default=secret_manager.utili.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
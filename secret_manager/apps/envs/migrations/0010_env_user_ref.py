@@ -0,0 +1,47 @@
+# Generated by Django 5.1 on 2026-10-18 20:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from secret_manager.migration_ops import PostgresOnly
+
+# Keeps user_ref filled for the previous release, which only writes the
+# email column, until the swap in 0013 drops the trigger
+FILL_USER_REF = [
+    """
+    CREATE FUNCTION "envs_env_fill_user_ref"() RETURNS trigger AS $$
+    BEGIN
+        NEW."user_ref_id" := (SELECT "id" FROM "users_user" WHERE "email" = NEW."user_id");
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    'CREATE TRIGGER "envs_env_fill_user_ref" BEFORE INSERT OR UPDATE OF "user_id" '
+    'ON "envs_env" FOR EACH ROW EXECUTE FUNCTION "envs_env_fill_user_ref"()',
+]
+DROP_FILL_USER_REF = [
+    'DROP TRIGGER IF EXISTS "envs_env_fill_user_ref" ON "envs_env"',
+    'DROP FUNCTION IF EXISTS "envs_env_fill_user_ref"()',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('envs', '0009_alter_env_id_alter_envsecret_id'),
+        ('users', '0008_alter_user_id'),
+    ]
+
+    # Stage 1 of moving Env.user from User.email to User.id: a nullable
+    # column without constraint or index, which PostgreSQL adds without
+    # rewriting or scanning the table. Stages 1 to 3 run while the previous
+    # release serves; on PostgreSQL a trigger fills the column for its
+    # writes from here on.
+    operations = [
+        migrations.AddField(
+            model_name='env',
+            name='user_ref',
+            field=models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.user'),
+        ),
+        PostgresOnly(FILL_USER_REF, DROP_FILL_USER_REF),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1 on 2026-10-18 20:41
+
+from django.db import migrations, transaction
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 1000
+
+
+def backfill(apps, schema_editor):
+    """Copy the owner's id into ``user_ref``, one short transaction per batch."""
+    Env = apps.get_model('envs', 'Env')
+    User = apps.get_model('users', 'User')
+    db = schema_editor.connection.alias
+    owner = User.objects.using(db).filter(email=OuterRef('user_id')).values('id')[:1]
+
+    last = None
+    while True:
+        pending = Env.objects.using(db).filter(user_ref__isnull=True).order_by('pk')
+        if last is not None:
+            pending = pending.filter(pk__gt=last)
+        batch = list(pending.values_list('pk', flat=True)[:BATCH_SIZE])
+        if not batch:
+            return
+        with transaction.atomic(using=db):
+            Env.objects.using(db).filter(pk__in=batch).update(user_ref=Subquery(owner))
+        last = batch[-1]
+
+
+class Migration(migrations.Migration):
+
+    # Stage 2: each batch commits on its own, so row locks are held for one
+    # batch and the table stays writable while the backfill runs
+    atomic = False
+
+    dependencies = [
+        ('envs', '0010_env_user_ref'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop, elidable=True),
+    ]
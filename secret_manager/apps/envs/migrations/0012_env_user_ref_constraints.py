@@ -0,0 +1,50 @@
+# Generated by Django 5.1 on 2026-10-18 20:42
+
+from django.db import migrations
+
+from secret_manager.migration_ops import PostgresOnly
+
+
+class Migration(migrations.Migration):
+
+    # Stage 3: build the index, unique index, foreign key and NOT NULL check
+    # of the new column without blocking the table, for the swap in 0013.
+    # Every statement commits on its own. The previous release keeps
+    # serving: the trigger from 0010 fills the column of the envs it adds,
+    # and 0011 filled the older ones.
+    atomic = False
+
+    dependencies = [
+        ('envs', '0011_backfill_env_user_ref'),
+        ('users', '0008_alter_user_id'),
+    ]
+
+    operations = [
+        PostgresOnly(
+            'CREATE INDEX CONCURRENTLY "envs_env_user_id_idx" ON "envs_env" ("user_ref_id")',
+            'DROP INDEX CONCURRENTLY IF EXISTS "envs_env_user_id_idx"',
+        ),
+        PostgresOnly(
+            'CREATE UNIQUE INDEX CONCURRENTLY "envs_env_name_user_id_uniq" '
+            'ON "envs_env" ("name", "user_ref_id")',
+            'DROP INDEX CONCURRENTLY IF EXISTS "envs_env_name_user_id_uniq"',
+        ),
+        PostgresOnly(
+            [
+                'ALTER TABLE "envs_env" ADD CONSTRAINT "envs_env_user_id_fk_users_user_id" '
+                'FOREIGN KEY ("user_ref_id") REFERENCES "users_user" ("id") '
+                'DEFERRABLE INITIALLY DEFERRED NOT VALID',
+                'ALTER TABLE "envs_env" VALIDATE CONSTRAINT "envs_env_user_id_fk_users_user_id"',
+            ],
+            'ALTER TABLE "envs_env" DROP CONSTRAINT IF EXISTS "envs_env_user_id_fk_users_user_id"',
+        ),
+        PostgresOnly(
+            'ALTER TABLE "envs_env" ADD CONSTRAINT "envs_env_user_id_not_null" '
+            'CHECK ("user_ref_id" IS NOT NULL) NOT VALID',
+            'ALTER TABLE "envs_env" DROP CONSTRAINT IF EXISTS "envs_env_user_id_not_null"',
+        ),
+        PostgresOnly(
+            'ALTER TABLE "envs_env" VALIDATE CONSTRAINT "envs_env_user_id_not_null"',
+            migrations.RunSQL.noop,
+        ),
+    ]
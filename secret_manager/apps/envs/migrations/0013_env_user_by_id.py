@@ -0,0 +1,70 @@
+# Generated by Django 5.1 on 2026-10-18 20:43
+
+import django.db.models.deletion
+from importlib import import_module
+
+from django.db import migrations, models
+
+from secret_manager.migration_ops import PostgresOnly, PreparedOnPostgres, is_postgres
+
+backfill = import_module('secret_manager.apps.envs.migrations.0011_backfill_env_user_ref').backfill
+env_user_ref = import_module('secret_manager.apps.envs.migrations.0010_env_user_ref')
+
+
+def catch_up(apps, schema_editor):
+    # On PostgreSQL the validated check already rules out unfilled rows
+    if not is_postgres(schema_editor):
+        backfill(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('envs', '0012_env_user_ref_constraints'),
+        ('users', '0008_alter_user_id'),
+    ]
+
+    # Stage 4: swap the columns. This drops the email column the previous
+    # release writes, apply it when switching to the new release, which
+    # only knows the swapped column. On PostgreSQL the indexes and
+    # constraints exist and are valid, so every statement only changes the
+    # catalog: NOT NULL is proven by the validated check instead of a table
+    # scan.
+    operations = [
+        PostgresOnly(env_user_ref.DROP_FILL_USER_REF, env_user_ref.FILL_USER_REF),
+        migrations.RunPython(catch_up, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='env',
+            unique_together=set(),
+        ),
+        migrations.RemoveField(
+            model_name='env',
+            name='user',
+        ),
+        migrations.RenameField(
+            model_name='env',
+            old_name='user_ref',
+            new_name='user',
+        ),
+        PreparedOnPostgres(
+            migrations.AlterField(
+                model_name='env',
+                name='user',
+                field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.user'),
+            ),
+            sql=[
+                'ALTER TABLE "envs_env" ALTER COLUMN "user_id" SET NOT NULL',
+                'ALTER TABLE "envs_env" DROP CONSTRAINT "envs_env_user_id_not_null"',
+            ],
+        ),
+        PreparedOnPostgres(
+            migrations.AlterUniqueTogether(
+                name='env',
+                unique_together={('name', 'user')},
+            ),
+            sql=[
+                'ALTER TABLE "envs_env" ADD CONSTRAINT "envs_env_name_user_id_uniq" '
+                'UNIQUE USING INDEX "envs_env_name_user_id_uniq"',
+            ],
+        ),
+    ]
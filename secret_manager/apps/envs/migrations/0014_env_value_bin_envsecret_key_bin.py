@@ -0,0 +1,68 @@
+# Generated by Django 5.1 on 2026-10-18 21:20
+
+from django.db import migrations, models
+
+from secret_manager.migration_ops import PostgresOnly
+
+# Keep the binary columns converted for the previous release, which only
+# writes the text ones, until the swap in 0017 drops the triggers. Same
+# conversion as key_bytes in 0015.
+FILL_BINARY = [
+    """
+    CREATE FUNCTION "envs_env_fill_value_bin"() RETURNS trigger AS $$
+    BEGIN
+        NEW."value_bin" := decode(NEW."value", 'hex');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    'CREATE TRIGGER "envs_env_fill_value_bin" BEFORE INSERT OR UPDATE OF "value" '
+    'ON "envs_env" FOR EACH ROW EXECUTE FUNCTION "envs_env_fill_value_bin"()',
+    r"""
+    CREATE FUNCTION "envs_envsecret_fill_key_bin"() RETURNS trigger AS $$
+    BEGIN
+        IF NEW."scheme" = 'rsa' THEN
+            NEW."key_bin" := decode(
+                regexp_replace(NEW."key", '-----[^-]*-----|\s', '', 'g'), 'base64'
+            );
+        ELSE
+            NEW."key_bin" := decode(NEW."key", 'hex');
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    'CREATE TRIGGER "envs_envsecret_fill_key_bin" BEFORE INSERT OR UPDATE OF "key", "scheme" '
+    'ON "envs_envsecret" FOR EACH ROW EXECUTE FUNCTION "envs_envsecret_fill_key_bin"()',
+]
+DROP_FILL_BINARY = [
+    'DROP TRIGGER IF EXISTS "envs_env_fill_value_bin" ON "envs_env"',
+    'DROP FUNCTION IF EXISTS "envs_env_fill_value_bin"()',
+    'DROP TRIGGER IF EXISTS "envs_envsecret_fill_key_bin" ON "envs_envsecret"',
+    'DROP FUNCTION IF EXISTS "envs_envsecret_fill_key_bin"()',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('envs', '0013_env_user_by_id'),
+    ]
+
+    # Stage 1 of moving ciphertext and key material to binary columns:
+    # nullable columns, added without rewriting the tables. Stages 1 to 3
+    # run while the previous release serves; on PostgreSQL triggers fill
+    # the columns for its writes from here on.
+    operations = [
+        migrations.AddField(
+            model_name='env',
+            name='value_bin',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='envsecret',
+            name='key_bin',
+            field=models.BinaryField(null=True),
+        ),
+        PostgresOnly(FILL_BINARY, DROP_FILL_BINARY),
+    ]
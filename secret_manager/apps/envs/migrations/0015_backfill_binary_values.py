@@ -0,0 +1,70 @@
+# Generated by Django 5.1 on 2026-10-18 21:21
+
+import base64
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 1000
+
+
+def key_bytes(key, scheme):
+    """Envelope keys were hex, RSA keys PKCS#1 PEM, whose body is the DER."""
+    if scheme == 'rsa':
+        return base64.b64decode(
+            ''.join(line for line in key.splitlines() if not line.startswith('-----'))
+        )
+    return bytes.fromhex(key)
+
+
+def convert(model, connection, source, target, to_bytes):
+    """Fill ``target`` from ``source`` where it is NULL, a batch per transaction.
+
+    Rows written since 0014 are converted by its triggers on PostgreSQL; a
+    row updated while its batch is converted keeps the trigger's value.
+    """
+    qn = connection.ops.quote_name
+    meta = model._meta
+    column = qn(meta.get_field(target).column)
+    update = (
+        f'UPDATE {qn(meta.db_table)} SET {column} = %s '
+        f'WHERE {qn(meta.pk.column)} = %s AND {column} IS NULL'
+    )
+    fields = ['pk', source] + (['scheme'] if model.__name__ == 'EnvSecret' else [])
+    manager = model.objects.using(connection.alias)
+    last = None
+    while True:
+        pending = manager.filter(**{f'{target}__isnull': True}).order_by('pk')
+        if last is not None:
+            pending = pending.filter(pk__gt=last)
+        rows = list(pending.values_list(*fields)[:BATCH_SIZE])
+        if not rows:
+            return
+        params = [
+            (to_bytes(*row[1:]), meta.pk.get_db_prep_value(row[0], connection))
+            for row in rows
+        ]
+        # One prepared UPDATE per row, bulk_update's CASE is quadratic
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.executemany(update, params)
+        last = rows[-1][0]
+
+
+def backfill(apps, schema_editor):
+    connection = schema_editor.connection
+    convert(apps.get_model('envs', 'EnvSecret'), connection, 'key', 'key_bin', key_bytes)
+    convert(apps.get_model('envs', 'Env'), connection, 'value', 'value_bin', bytes.fromhex)
+
+
+class Migration(migrations.Migration):
+
+    # Stage 2: batches commit on their own and the tables stay writable
+    atomic = False
+
+    dependencies = [
+        ('envs', '0014_env_value_bin_envsecret_key_bin'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop, elidable=True),
+    ]
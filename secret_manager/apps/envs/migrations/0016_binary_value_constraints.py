@@ -0,0 +1,41 @@
+# Generated by Django 5.1 on 2026-10-18 21:22
+
+from django.db import migrations
+
+from secret_manager.migration_ops import PostgresOnly
+
+
+class Migration(migrations.Migration):
+
+    # Stage 3: prove the binary columns NOT NULL with validated checks, so
+    # the swap in 0017 needs no table scan under its lock. Every statement
+    # commits on its own. The previous release keeps serving: the triggers
+    # from 0014 fill the columns of the rows it writes, and 0015 filled the
+    # older ones.
+    atomic = False
+
+    dependencies = [
+        ('envs', '0015_backfill_binary_values'),
+    ]
+
+    operations = [
+        PostgresOnly(
+            [
+                'ALTER TABLE "envs_env" ADD CONSTRAINT "envs_env_value_bin_not_null" '
+                'CHECK ("value_bin" IS NOT NULL) NOT VALID',
+                'ALTER TABLE "envs_envsecret" ADD CONSTRAINT "envs_envsecret_key_bin_not_null" '
+                'CHECK ("key_bin" IS NOT NULL) NOT VALID',
+            ],
+            [
+                'ALTER TABLE "envs_env" DROP CONSTRAINT IF EXISTS "envs_env_value_bin_not_null"',
+                'ALTER TABLE "envs_envsecret" DROP CONSTRAINT IF EXISTS "envs_envsecret_key_bin_not_null"',
+            ],
+        ),
+        PostgresOnly(
+            [
+                'ALTER TABLE "envs_env" VALIDATE CONSTRAINT "envs_env_value_bin_not_null"',
+                'ALTER TABLE "envs_envsecret" VALIDATE CONSTRAINT "envs_envsecret_key_bin_not_null"',
+            ],
+            migrations.RunSQL.noop,
+        ),
+    ]
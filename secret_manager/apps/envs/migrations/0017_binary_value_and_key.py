@@ -0,0 +1,73 @@
+# Generated by Django 5.1 on 2026-10-18 21:23
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+from secret_manager.migration_ops import PostgresOnly, PreparedOnPostgres, is_postgres
+
+backfill = import_module('secret_manager.apps.envs.migrations.0015_backfill_binary_values').backfill
+binary_columns = import_module('secret_manager.apps.envs.migrations.0014_env_value_bin_envsecret_key_bin')
+
+
+def catch_up(apps, schema_editor):
+    # On PostgreSQL 0015 and the triggers converted every row, the validated
+    # checks prove none is left
+    if not is_postgres(schema_editor):
+        backfill(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('envs', '0016_binary_value_constraints'),
+    ]
+
+    # Stage 4: swap the columns. This drops the text columns the previous
+    # release writes, apply it when switching to the new release. On
+    # PostgreSQL NOT NULL is proven by the checks validated in 0016, every
+    # other statement only changes the catalog.
+    operations = [
+        PostgresOnly(binary_columns.DROP_FILL_BINARY, binary_columns.FILL_BINARY),
+        migrations.RunPython(catch_up, migrations.RunPython.noop),
+        PreparedOnPostgres(
+            migrations.AlterField(
+                model_name='env',
+                name='value_bin',
+                field=models.BinaryField(),
+            ),
+            sql=[
+                'ALTER TABLE "envs_env" ALTER COLUMN "value_bin" SET NOT NULL',
+                'ALTER TABLE "envs_env" DROP CONSTRAINT "envs_env_value_bin_not_null"',
+            ],
+        ),
+        PreparedOnPostgres(
+            migrations.AlterField(
+                model_name='envsecret',
+                name='key_bin',
+                field=models.BinaryField(),
+            ),
+            sql=[
+                'ALTER TABLE "envs_envsecret" ALTER COLUMN "key_bin" SET NOT NULL',
+                'ALTER TABLE "envs_envsecret" DROP CONSTRAINT "envs_envsecret_key_bin_not_null"',
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='env',
+            name='value',
+        ),
+        migrations.RemoveField(
+            model_name='envsecret',
+            name='key',
+        ),
+        migrations.RenameField(
+            model_name='env',
+            old_name='value_bin',
+            new_name='value',
+        ),
+        migrations.RenameField(
+            model_name='envsecret',
+            old_name='key_bin',
+            new_name='key',
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1 on 2026-10-18 22:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('envs', '0017_binary_value_and_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='env',
+            name='size',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='EnvChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('env', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='envs.env')),
+            ],
+            options={
+                'unique_together': {('env', 'index')},
+            },
+        ),
+    ]
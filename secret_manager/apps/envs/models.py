@@ -1,40 +1,122 @@
-from django.db import models
+from django.db import IntegrityError, connections, models, router
+from django.db.models import F
 from secret_manager.apps.users.models import User
-from uuid import uuid4
-from secret_manager.utili import unique_id
+from secret_manager.apps.envs.crypto import SCHEME_CHOICES, SCHEME_RSA
+from secret_manager.utili import ulid, uuid7
+
+# Inserts tried before giving up on a colliding generated id
+ID_ATTEMPTS = 3
 
 
 class EnvSecret(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
-    key = models.TextField()
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    key = models.BinaryField()
+    scheme = models.CharField(max_length=10, choices=SCHEME_CHOICES, default=SCHEME_RSA)
+    # master key version that wraps the data key, only set for envelope rows
+    key_version = models.PositiveSmallIntegerField(null=True, blank=True)
 
     def __str__(self):
-        return self.key
+        return f"{self.scheme} key {self.id}"
+
+
+class EnvQuerySet(models.QuerySet):
+    def with_user_email(self):
+        """Select the owner's email as ``user_email`` instead of loading the user."""
+        return self.annotate(user_email=F("user__email"))
+
+    def consume_request(self, id):
+        """Atomically use up one API request of env ``id``.
+
+        Returns the remaining count, or ``None`` when the env does not exist
+        or its quota is exhausted. Only the counter column is written.
+        """
+        return self.consume_requests([id]).get(id)
+
+    def consume_requests(self, ids):
+        """Use up one API request of every env in ``ids`` with one UPDATE.
+
+        Returns ``{id: remaining}`` for the envs that still had quota left.
+        """
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return {}
+
+        db = router.db_for_write(self.model)
+        connection = connections[db]
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        column = qn(self.model._meta.get_field("api_requests").column)
+        pk = qn(self.model._meta.pk.column)
+        placeholders = ", ".join(["%s"] * len(ids))
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET {column} = {column} - 1 "
+                f"WHERE {pk} IN ({placeholders}) AND {column} > 0 "
+                f"RETURNING {pk}, {column}",
+                ids,
+            )
+            return dict(cursor.fetchall())
 
 
 class Env(models.Model):
     id = models.CharField(
-        max_length=18, primary_key=True, default=unique_id, editable=False
+        max_length=26, primary_key=True, default=ulid, editable=False
     )
     name = models.CharField(max_length=100)
-    value = models.CharField(max_length=1000)
-    user = models.ForeignKey(User, to_field="email", on_delete=models.CASCADE)
+    value = models.BinaryField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
     key_id = models.ForeignKey(EnvSecret, to_field="id", on_delete=models.CASCADE)
     description = models.TextField(blank=True, null=True)
     access_password = models.CharField(max_length=100, default="")
     api_requests = models.IntegerField(default=1000)
+    # Plaintext size of a large secret, whose value is kept in EnvChunk rows
+    # instead of ``value``; NULL for regular envs
+    size = models.PositiveBigIntegerField(null=True, blank=True)
     createdAt = models.DateTimeField(auto_now_add=True)
     updatedAt = models.DateTimeField(auto_now=True)
 
+    objects = EnvQuerySet.as_manager()
+
     # add api access passwird
     class Meta:
         unique_together = ("name", "user")
+        indexes = [models.Index(fields=["createdAt", "id"], name="env_created_id_idx")]
 
     def __str__(self):
         return f"{self.name} ({self.value})"
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+
+        db = kwargs.get("using") or router.db_for_write(Env, instance=self)
+        for attempt in range(1, ID_ATTEMPTS + 1):
+            try:
+                return super().save(*args, **kwargs)
+            except IntegrityError:
+                # Retry only a clash on the generated id, and only in
+                # autocommit where the failed INSERT left nothing behind
+                if (
+                    attempt == ID_ATTEMPTS
+                    or connections[db].in_atomic_block
+                    or not Env.objects.using(db).filter(pk=self.pk).exists()
+                ):
+                    raise
+                self.pk = ulid()
+
     def delete(self, *args, **kwargs):
-        # Ensure the related EnvSecret is deleted first
-        if self.key_id:
-            self.key_id.delete()
-        super().delete(*args, **kwargs)
+        # Deleting the EnvSecret cascades to this env, without loading the
+        # secret row first or deleting the env a second time
+        return EnvSecret.objects.filter(id=self.key_id_id).delete()
+
+
+class EnvChunk(models.Model):
+    """One encrypted chunk of a large secret, see ``large``."""
+
+    env = models.ForeignKey(Env, on_delete=models.CASCADE, related_name="chunks")
+    index = models.PositiveIntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        unique_together = ("env", "index")
@@ -0,0 +1,177 @@
+"""API request quota accounting for env reads.
+
+``QUOTA_MODE = "strict"`` decrements ``Env.api_requests`` with one
+conditional UPDATE per read. ``"write_behind"`` keeps decrements in a
+process-local counter store and flushes them to the database in a single
+batched UPDATE every ``QUOTA_FLUSH_INTERVAL_MS`` or once an env collects
+``QUOTA_FLUSH_HITS`` unflushed hits, whichever comes first.
+
+In write-behind mode a process only sees other processes' decrements once
+they are flushed, so each process can over-serve an env by its unflushed
+decrements of it: up to about twice ``QUOTA_FLUSH_HITS``, one batch being
+written while the next collects. A request may hold a row loaded before its
+own process's last flush committed; the counts read back after each flush
+are used instead of such stale rows for one flush interval.
+"""
+
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+
+from secret_manager.apps.envs.models import Env
+
+logger = logging.getLogger(__name__)
+
+MODE_STRICT = "strict"
+MODE_WRITE_BEHIND = "write_behind"
+
+
+class WriteBehindCounter:
+    def __init__(self, flush_interval, flush_hits):
+        self.flush_interval = flush_interval
+        self.flush_hits = flush_hits
+        self._pending = {}
+        # Decrements taken out of _pending by a flush whose UPDATE has not
+        # committed yet; still subtracted from the loaded api_requests
+        self._flushing = {}
+        # {id: (api_requests, time)} read back after the last flush
+        self._flushed = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def consume(self, env):
+        """Take one request from ``env``'s quota.
+
+        Returns the remaining count, or ``None`` when the quota is exhausted.
+        """
+        self._ensure_started()
+        with self._lock:
+            pending = self._pending.get(env.id, 0)
+            base = env.api_requests
+            flushed, at = self._flushed.get(env.id, (base, 0))
+            if time.monotonic() - at < self.flush_interval:
+                # The row may predate the flush, whose count is then lower
+                base = min(base, flushed)
+            remaining = base - pending - self._flushing.get(env.id, 0)
+            if remaining <= 0:
+                return None
+            self._pending[env.id] = pending + 1
+            flush_now = pending + 1 >= self.flush_hits
+
+        if flush_now:
+            self.flush()
+        return remaining - 1
+
+    def flush(self):
+        """Write all pending decrements with one UPDATE."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._flushing = batch
+            if not batch:
+                return
+
+            decrement = Case(
+                *[When(id=id, then=Value(count)) for id, count in batch.items()],
+                default=Value(0),
+            )
+            try:
+                Env.objects.filter(id__in=batch).update(
+                    api_requests=Greatest(F("api_requests") - decrement, Value(0))
+                )
+            except Exception as e:
+                logger.error(f"Quota flush failed, retrying later: {e}")
+                with self._lock:
+                    for id, count in batch.items():
+                        self._pending[id] = self._pending.get(id, 0) + count
+                    self._flushing = {}
+                return
+
+            try:
+                counts = dict(
+                    Env.objects.filter(id__in=batch).values_list("id", "api_requests")
+                )
+            except Exception as e:
+                logger.error(f"Reading quotas back after a flush failed: {e}")
+                counts = {}
+            now = time.monotonic()
+            with self._lock:
+                self._flushed = {
+                    id: (count, at)
+                    for id, (count, at) in self._flushed.items()
+                    if now - at < self.flush_interval
+                }
+                self._flushed.update((id, (count, now)) for id, count in counts.items())
+                self._flushing = {}
+
+    def shutdown(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval * 2)
+        self.flush()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="quota-flush", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.shutdown)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            close_old_connections()
+            self.flush()
+
+
+_counter = None
+_counter_lock = threading.Lock()
+
+
+def get_counter():
+    global _counter
+    if _counter is None:
+        with _counter_lock:
+            if _counter is None:
+                _counter = WriteBehindCounter(
+                    flush_interval=settings.QUOTA_FLUSH_INTERVAL_MS / 1000,
+                    flush_hits=settings.QUOTA_FLUSH_HITS,
+                )
+    return _counter
+
+
+def consume(env):
+    """Use one API request of ``env`` according to ``QUOTA_MODE``.
+
+    Returns the remaining count, or ``None`` when the quota is exhausted.
+    """
+    if settings.QUOTA_MODE == MODE_WRITE_BEHIND:
+        return get_counter().consume(env)
+    return Env.objects.consume_request(env.id)
+
+
+def consume_many(envs):
+    """Use one API request of each env in ``envs``.
+
+    Returns ``{id: remaining}`` for the envs that still had quota left.
+    """
+    if settings.QUOTA_MODE == MODE_WRITE_BEHIND:
+        counter = get_counter()
+        remaining = {}
+        for env in {env.id: env for env in envs}.values():
+            left = counter.consume(env)
+            if left is not None:
+                remaining[env.id] = left
+        return remaining
+    return Env.objects.consume_requests([env.id for env in envs])
@@ -1,22 +1,49 @@
+from django.conf import settings
 from django.urls import path
 
-from secret_manager.apps.envs.views import (
-    add_env,
-    change_access_password,
-    get_env,
-    get_envs,
-    get_envs_by_user,
-    update_env,
-    delete_secret,
-)
+if settings.ASYNC_VIEWS:
+    from secret_manager.apps.envs.async_views import (
+        add_env,
+        batch_get_env,
+        change_access_password,
+        get_env,
+        get_envs,
+        get_envs_by_user,
+        get_stats,
+        update_env,
+        delete_secret,
+        upload_env,
+        download_env,
+        import_envs,
+    )
+else:
+    from secret_manager.apps.envs.views import (
+        add_env,
+        batch_get_env,
+        change_access_password,
+        get_env,
+        get_envs,
+        get_envs_by_user,
+        get_stats,
+        update_env,
+        delete_secret,
+        upload_env,
+        download_env,
+        import_envs,
+    )
 
 urlpatterns = [
     # /users/adduser/?username=lakshay
     path("getenvs/", get_envs, name="getenvs"),
     path("add/", add_env, name="addenv"),
     path("get/", get_env, name="getenv"),
+    path("batchget/", batch_get_env, name="batchgetenv"),
+    path("upload/", upload_env, name="uploadenv"),
+    path("download/", download_env, name="downloadenv"),
+    path("import/", import_envs, name="importenvs"),
     path("update/", update_env, name="updateenv"),
     path("delete/", delete_secret, name="deleteenv"),
     path("getuserenvs/", get_envs_by_user, name="getuserenvs"),
     path("accesspassword/", change_access_password, name="accesspassword"),
+    path("stats/", get_stats, name="envstats"),
 ]
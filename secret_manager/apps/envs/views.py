@@ -4,14 +4,25 @@ import random
 
 import dotenv
 import rsa
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import IntegrityError
-from django.http import HttpResponseBadRequest, JsonResponse
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 
+from secret_manager.apps.envs import crypto, importer, keypool, large, quota, workers
+from secret_manager.apps.envs.cache import secret_cache
 from secret_manager.apps.envs.models import Env, EnvSecret
-from secret_manager.apps.users.models import User
-from secret_manager.utili import decode_jwt
+from secret_manager.auth import is_admin, jwt_required, principal_cache
+from secret_manager.db_router import pinned
+from secret_manager.querybudget import query_budget
+from secret_manager.utili import (
+    chunked,
+    page_params,
+    paginate,
+    stream_format,
+    stream_response,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -24,39 +35,266 @@ def error_response(message, status_code):
     return JsonResponse({"error": message}, status=status_code)
 
 
+ENV_LIST_FIELDS = (
+    "id",
+    "name",
+    "value",
+    "user__email",
+    "description",
+    "access_password",
+    "createdAt",
+)
+
+
+def env_row(row):
+    return {
+        "id": row["id"],
+        "name": row["name"],
+        # Listings show the ciphertext, hex encoded as before
+        "value": bytes(row["value"]).hex(),
+        "user": row["user__email"],
+        "description": row["description"],
+        "access_password": row["access_password"],
+    }
+
+
+LARGE_SECRET_ERROR = "Env is a large secret, use the download endpoint"
+
+
+def content_length(request):
+    try:
+        return int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        return 0
+
+
+def large_env_response(env):
+    return JsonResponse(
+        {
+            "message": "Env created successfully",
+            "data": {
+                "id": env.id,
+                "name": env.name,
+                "size": env.size,
+                "access_password": env.access_password,
+                "description": env.description,
+            },
+        }
+    )
+
+
+def limit_exceeded_response(env):
+    return JsonResponse(
+        {
+            "message": "Request limit exceeded",
+            "data": {
+                "name": env.name,
+                "value": "",
+                "user": env.user_email,
+            },
+        }
+    )
+
+
+def decrypt_value(env):
+    """Decrypt ``env.value``, serving hot secrets from the secret cache."""
+    value = secret_cache.get(env)
+    if value is None:
+        value = crypto.decrypt_env(env)
+        secret_cache.set(env, value)
+    return value
+
+
+def cached_values(envs):
+    """Look ``envs`` up in the secret cache.
+
+    Returns a ``(value, error)`` pair per env and the rows to decrypt for the
+    envs that missed, see ``store_values``. Large secrets are never
+    decrypted here, their value stays ``None``.
+    """
+    results = [
+        (secret_cache.get(env) if env.size is None else None, None) for env in envs
+    ]
+    misses = [
+        i
+        for i, (value, _) in enumerate(results)
+        if value is None and envs[i].size is None
+    ]
+    rows = [
+        (
+            # memoryview, which some drivers return, can't go to the pool
+            bytes(envs[i].value),
+            bytes(envs[i].key_id.key),
+            envs[i].key_id.scheme,
+            envs[i].key_id.key_version,
+        )
+        for i in misses
+    ]
+    return results, misses, rows
+
+
+def store_values(envs, results, misses, decrypted):
+    for i, (value, error) in zip(misses, decrypted):
+        results[i] = (value, error)
+        if error is None:
+            secret_cache.set(envs[i], value)
+    return results
+
+
+def decrypt_values(envs):
+    """Decrypt many envs, spreading cache misses over the worker pool.
+
+    Returns a ``(value, error)`` pair per env, in the order given.
+    """
+    results, misses, rows = cached_values(envs)
+    return store_values(envs, results, misses, workers.decrypt_rows(rows))
+
+
+def user_env_item(user, env, value, error):
+    item = {
+        "id": env.id,
+        "name": env.name,
+        "value": value,
+        "user": user.email,
+        "description": env.description,
+        "access_password": env.access_password,
+        "api_requests": env.api_requests,
+    }
+    if env.size is not None:
+        # Large secrets are fetched from the download endpoint
+        item["size"] = env.size
+    if error is not None:
+        logger.error(f"Decryption error for env {env.id}: {error}")
+        item["error"] = "Decryption failed"
+    return item
+
+
+def user_env_rows(user, envs):
+    """Yield the decrypted rows of ``user``'s envs, a chunk at a time."""
+    for chunk in chunked(envs, settings.STREAM_CHUNK_SIZE):
+        for env, (value, error) in zip(chunk, decrypt_values(chunk)):
+            yield user_env_item(user, env, value, error)
+
+
+def batch_items(data):
+    items = data.get("items")
+    if not isinstance(items, list) or not items:
+        raise ValueError("Items are missing")
+    if len(items) > settings.BATCH_GET_MAX_ITEMS:
+        raise ValueError(f"At most {settings.BATCH_GET_MAX_ITEMS} items are allowed")
+    for item in items:
+        # Keys are looked up in a dict, unhashable ones would fail with a 500
+        if isinstance(item, dict) and "key" in item and not isinstance(item["key"], str):
+            raise ValueError("Item keys must be strings")
+    return items
+
+
+def batch_keys(items):
+    return [item["key"] for item in items if isinstance(item, dict) and item.get("key")]
+
+
+def batch_allowed(items, envs):
+    """Envs of ``items`` whose password matched, each once."""
+    allowed = {}
+    for item in items:
+        env = envs.get(item.get("key")) if isinstance(item, dict) else None
+        if env and env.size is None and env.api_requests > 0:
+            if item.get("access_password") == env.access_password:
+                allowed[env.id] = env
+    return list(allowed.values())
+
+
+def batch_results(items, envs, values):
+    """Build the per-item results of a batch get.
+
+    ``values`` maps the id of every env that was served to its
+    ``(value, error)`` pair; envs missing from it ran out of quota.
+    """
+    results = []
+    for item in items:
+        if not isinstance(item, dict):
+            results.append({"error": "Invalid item", "status": 400})
+            continue
+        key = item.get("key")
+        access_password = item.get("access_password")
+        if not key or not access_password:
+            results.append(
+                {"key": key, "error": "Missing key or access password", "status": 400}
+            )
+            continue
+
+        env = envs.get(key)
+        if env is None:
+            results.append({"key": key, "error": "Env not found", "status": 404})
+        elif env.size is not None:
+            results.append({"key": key, "error": LARGE_SECRET_ERROR, "status": 400})
+        elif env.api_requests > 0 and access_password != env.access_password:
+            results.append(
+                {"key": key, "error": "Invalid access password", "status": 401}
+            )
+        elif env.id not in values:
+            results.append({"key": key, "error": "Request limit exceeded", "status": 429})
+        elif values[env.id][1] is not None:
+            results.append({"key": key, "error": "Decryption failed", "status": 500})
+        else:
+            results.append(
+                {
+                    "key": key,
+                    "name": env.name,
+                    "value": values[env.id][0],
+                    "user": env.user_email,
+                    "status": 200,
+                }
+            )
+    return results
+
+
+def seal_value(value):
+    """Encrypt ``value`` and save the key material it needs in an EnvSecret."""
+    sealed = crypto.encrypt(value)
+    secret = EnvSecret(
+        key=sealed.key, scheme=sealed.scheme, key_version=sealed.key_version
+    )
+    secret.save()
+    return sealed.value, secret
+
+
+@query_budget(1)
 @csrf_exempt
 def get_envs(request):
     if request.method == "GET":
-        envs = Env.objects.all()
-        env_list = [
+        envs = Env.objects.values(*ENV_LIST_FIELDS)
+        try:
+            fmt = stream_format(request)
+            if fmt:
+                rows = pinned(envs.order_by("createdAt", "id")).iterator(
+                    chunk_size=settings.STREAM_CHUNK_SIZE
+                )
+                return stream_response(
+                    "Successfully fetched all envs", map(env_row, rows), fmt
+                )
+
+            cursor, limit = page_params(request)
+            rows, next_cursor = paginate(envs, cursor, limit)
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        return JsonResponse(
             {
-                "id": env.id,
-                "name": env.name,
-                "value": env.value,
-                "user": env.user.email,
-                "description": env.description,
-                "access_password": env.access_password,
+                "message": "Successfully fetched all envs",
+                "data": [env_row(row) for row in rows],
+                "next_cursor": next_cursor,
             }
-            for env in envs
-        ]
-        return JsonResponse(
-            {"message": "Successfully fetched all envs", "data": env_list}
         )
     return error_response("Invalid request method", 405)
 
 
+@query_budget(4)
 @csrf_exempt
+@jwt_required
 def add_env(request):
     if request.method == "POST":
         try:
-            token = request.COOKIES.get("session_token")
-            if not token:
-                return error_response("Authentication token is missing", 401)
-
-            payload = decode_jwt(token)
-            if not payload:
-                return error_response("Invalid token or token has expired", 401)
-
             data = json.loads(request.body)
             name = data.get("name")
             value = data.get("value")
@@ -66,22 +304,16 @@ def add_env(request):
             if not value:
                 return error_response("Secret value is missing", 400)
 
-            user = User.objects.get(id=payload["id"])
-
-            # Generate RSA keys
-            publicKey, privateKey = rsa.newkeys(1024)
-            encrypted_value = rsa.encrypt(value.encode(), publicKey)
+            user = request.principal
 
-            # Save private key in ENVSecret
-            privateKey_instance = EnvSecret(key=privateKey.save_pkcs1().decode("utf-8"))
-            privateKey_instance.save()
+            encrypted_value, secret = seal_value(value)
 
             access_password = random.randbytes(4).hex()
             env = Env(
                 name=name,
-                value=encrypted_value.hex(),
+                value=encrypted_value,
                 user=user,
-                key_id=privateKey_instance,
+                key_id=secret,
                 description=description,
                 access_password=access_password,
             )
@@ -101,9 +333,7 @@ def add_env(request):
             )
         except json.JSONDecodeError:
             return HttpResponseBadRequest("Invalid JSON format")
-        except ObjectDoesNotExist:
-            return error_response("User does not exist", 404)
-        except rsa.pkcs1.CryptoError:
+        except (crypto.CryptoError, rsa.pkcs1.CryptoError):
             return error_response("Encryption failed", 500)
         except IntegrityError:
             return error_response("Secret with same name already exists", 400)
@@ -114,6 +344,7 @@ def add_env(request):
     return error_response("Invalid request method", 405)
 
 
+@query_budget(2)
 @csrf_exempt
 def get_env(request):
     if request.method == "GET":
@@ -124,31 +355,23 @@ def get_env(request):
             if not key or not access_password:
                 return error_response("Missing key or access password", 400)
 
-            env = Env.objects.get(id=key)
+            env = Env.objects.select_related("key_id").with_user_email().get(id=key)
             logger.info(f"API Request Count Before: {env.api_requests}")
 
+            if env.size is not None:
+                return error_response(LARGE_SECRET_ERROR, 400)
+
             if env.api_requests <= 0:
-                return JsonResponse(
-                    {
-                        "message": "Request limit exceeded",
-                        "data": {
-                            "name": env.name,
-                            "value": "",
-                            "user": env.user.email,
-                        },
-                    }
-                )
+                return limit_exceeded_response(env)
             if access_password != env.access_password:
                 return error_response("Invalid access password", 401)
 
-            # Decrypt the value
-            private_key = rsa.PrivateKey.load_pkcs1(env.key_id.key.encode())
-            encrypted_value = bytes.fromhex(env.value)
-            decrypted_value = rsa.decrypt(encrypted_value, private_key).decode()
+            remaining = quota.consume(env)
+            if remaining is None:
+                return limit_exceeded_response(env)
+            logger.info(f"API Request Count After: {remaining}")
 
-            env.api_requests -= 1
-            env.save()
-            logger.info(f"API Request Count After: {env.api_requests}")
+            decrypted_value = decrypt_value(env)
 
             return JsonResponse(
                 {
@@ -156,13 +379,13 @@ def get_env(request):
                     "data": {
                         "name": env.name,
                         "value": decrypted_value,
-                        "user": env.user.email,
+                        "user": env.user_email,
                     },
                 }
             )
         except ObjectDoesNotExist:
             return error_response("Env not found", 404)
-        except rsa.pkcs1.CryptoError:
+        except crypto.CryptoError:
             return error_response("Decryption failed", 500)
         except Exception as e:
             logger.error(f"Unexpected error: {e}", exc_info=True)
@@ -171,82 +394,192 @@ def get_env(request):
     return error_response("Invalid request method", 405)
 
 
+@query_budget(2)
 @csrf_exempt
-def get_envs_by_user(request):
+def batch_get_env(request):
+    if request.method == "POST":
+        try:
+            items = batch_items(json.loads(request.body))
+            envs = (
+                Env.objects.select_related("key_id")
+                .with_user_email()
+                .in_bulk(batch_keys(items))
+            )
+
+            # Only envs whose password matched use up a request
+            remaining = quota.consume_many(batch_allowed(items, envs))
+            served = [env for env in envs.values() if env.id in remaining]
+            values = dict(zip([env.id for env in served], decrypt_values(served)))
+            results = batch_results(items, envs, values)
+
+            return JsonResponse(
+                {"message": "Successfully fetched envs", "data": results}
+            )
+        except json.JSONDecodeError:
+            return HttpResponseBadRequest("Invalid JSON format")
+        except ValueError as e:
+            return error_response(str(e), 400)
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}", exc_info=True)
+            return error_response(str(e), 500)
+
+    return error_response("Invalid request method", 405)
+
+
+def import_response(results):
+    return JsonResponse({"message": "Successfully imported envs", "data": results})
+
+
+@query_budget(3)
+@csrf_exempt
+@jwt_required
+def import_envs(request):
+    """Create or update envs from a ``.env`` file or JSON object, see ``importer``."""
+    if request.method == "POST":
+        try:
+            values = importer.parse(request.body, request.content_type)
+            existing = {
+                env.name: env
+                for env in importer.existing_envs(request.principal, values)
+            }
+            current = dict(zip(existing, decrypt_values(list(existing.values()))))
+            results = importer.upsert(request.principal, values, existing, current)
+            return import_response(results)
+        except json.JSONDecodeError:
+            return HttpResponseBadRequest("Invalid JSON format")
+        except ValueError as e:
+            return error_response(str(e), 400)
+        except (crypto.CryptoError, rsa.pkcs1.CryptoError):
+            return error_response("Encryption failed", 500)
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}", exc_info=True)
+            return error_response(str(e), 500)
+
+    return error_response("Invalid request method", 405)
+
+
+@query_budget(4)
+@csrf_exempt
+@jwt_required
+def upload_env(request):
+    """Store the raw request body as a large secret, see ``large``."""
+    if request.method == "POST":
+        name = request.GET.get("name")
+        if not name:
+            return error_response("Secret name is missing", 400)
+
+        env = Env(
+            name=name,
+            user=request.principal,
+            description=request.GET.get("description"),
+            access_password=random.randbytes(4).hex(),
+        )
+        try:
+            # The body is read a chunk at a time, never as request.body
+            large.store(env, request, content_length(request))
+            return large_env_response(env)
+        except large.SecretTooLarge as e:
+            return error_response(str(e), 413)
+        except ValueError as e:
+            return error_response(str(e), 400)
+        except crypto.CryptoError:
+            return error_response("Encryption failed", 500)
+        except IntegrityError:
+            return error_response("Secret with same name already exists", 400)
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}", exc_info=True)
+            return error_response(str(e), 500)
+
+    return error_response("Invalid request method", 405)
+
+
+@query_budget(3)
+@csrf_exempt
+def download_env(request):
+    """Stream the decrypted value of a large secret."""
     if request.method == "GET":
-        token = request.COOKIES.get("session_token")
-        if not token:
-            return error_response("Authentication token is missing", 401)
+        try:
+            key = request.GET.get("key")
+            access_password = request.GET.get("access_password")
+
+            if not key or not access_password:
+                return error_response("Missing key or access password", 400)
+
+            env = Env.objects.select_related("key_id").with_user_email().get(id=key)
+
+            if env.size is None:
+                return error_response("Env is not a large secret", 400)
+            if env.api_requests <= 0:
+                return limit_exceeded_response(env)
+            if access_password != env.access_password:
+                return error_response("Invalid access password", 401)
+            if quota.consume(env) is None:
+                return limit_exceeded_response(env)
 
-        payload = decode_jwt(token)
-        if not payload:
-            return error_response("Invalid token or token has expired", 401)
+            response = StreamingHttpResponse(
+                large.iter_plaintext(env), content_type="application/octet-stream"
+            )
+            response["Content-Length"] = str(env.size)
+            return response
+        except ObjectDoesNotExist:
+            return error_response("Env not found", 404)
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}", exc_info=True)
+            return error_response(str(e), 500)
+
+    return error_response("Invalid request method", 405)
 
+
+@query_budget(3)
+@csrf_exempt
+@jwt_required
+def get_envs_by_user(request):
+    if request.method == "GET":
+        user = request.principal
         try:
-            user = User.objects.get(id=payload["id"])
-        except User.DoesNotExist:
-            return error_response("User not found", 404)
+            fmt = stream_format(request)
+        except ValueError as e:
+            return error_response(str(e), 400)
 
         envs = Env.objects.filter(user=user).select_related("key_id")
-        env_list = []
-
-        for env in envs:
-            try:
-                private_key = rsa.PrivateKey.load_pkcs1(env.key_id.key.encode())
-                encrypted_value = bytes.fromhex(env.value)
-                decrypted_value = rsa.decrypt(encrypted_value, private_key).decode()
-                env_list.append(
-                    {
-                        "id": env.id,
-                        "name": env.name,
-                        "value": decrypted_value,
-                        "user": env.user.email,
-                        "description": env.description,
-                        "access_password": env.access_password,
-                        "api_requests": env.api_requests,
-                    }
-                )
-            except (ValueError, rsa.DecryptionError) as e:
-                logger.error(
-                    f"Decryption error for env {env.id}: {str(e)}", exc_info=True
-                )
-                return error_response(f"Decryption error: {str(e)}", 500)
+        if fmt:
+            rows = pinned(envs.order_by("createdAt", "id")).iterator(
+                chunk_size=settings.STREAM_CHUNK_SIZE
+            )
+            return stream_response(
+                "Successfully fetched all envs", user_env_rows(user, rows), fmt
+            )
 
         return JsonResponse(
-            {"message": "Successfully fetched all envs", "data": env_list}
+            {
+                "message": "Successfully fetched all envs",
+                "data": list(user_env_rows(user, envs)),
+            }
         )
 
     return error_response("Invalid request method", 405)
 
 
+@query_budget(4)
 @csrf_exempt
+@jwt_required
 def change_access_password(request):
     if request.method == "PUT":
-        token = request.COOKIES.get("session_token")
         data = json.loads(request.body)
         name = data.get("name")
 
         if name is None:
             return error_response("Env name is missing", 400)
 
-        if not token:
-            return error_response("Authentication token is missing", 401)
-
-        payload = decode_jwt(token)
-        if not payload:
-            return error_response("Invalid token or token has expired", 401)
-
         try:
-            user = User.objects.get(id=payload["id"])
-            env = Env.objects.get(name=name, user=user)
-        except User.DoesNotExist:
-            return error_response("User not found", 404)
+            env = Env.objects.get(name=name, user=request.principal)
         except Env.DoesNotExist:
             return error_response("Env not found", 404)
 
         access_password = random.randbytes(4).hex()
         env.access_password = access_password
         env.save()
+        secret_cache.invalidate(env.id)
 
         return JsonResponse(
             {
@@ -258,44 +591,37 @@ def change_access_password(request):
     return error_response("Invalid request method", 405)
 
 
+@query_budget(7)
 @csrf_exempt
+@jwt_required
 def update_env(request):
     if request.method == "PUT":
-        token = request.COOKIES.get("session_token")
         data = json.loads(request.body)
         id = data.get("id")
-
-        if not token:
-            return error_response("Authentication token is missing", 401)
-
-        payload = decode_jwt(token)
-        if not payload:
-            return error_response("Invalid token or token has expired", 401)
         name = data.get("name")
+        user = request.principal
         try:
-            user = User.objects.get(id=payload["id"])
-            if not user:
-                return error_response("User not found", 404)
-
-            if Env.objects.get(name=name, user=user):
+            if (
+                name
+                and Env.objects.filter(name=name, user=user).exclude(id=id).exists()
+            ):
                 return error_response("Secret with same name already exists", 400)
 
-            env = Env.objects.get(id=id)
-        except User.DoesNotExist:
-            return error_response("User not found", 404)
+            env = Env.objects.select_related("key_id").get(id=id)
         except Env.DoesNotExist:
             return error_response("Env not found", 404)
 
         value = data.get("value")
+        old_secret = None
         if value:
-            # Delete the old EnvSecret and generate a new one
-            env.key_id.delete()
-            publicKey, privateKey = rsa.newkeys(1024)
-            encrypted_value = rsa.encrypt(value.encode(), publicKey)
-            privateKey_instance = EnvSecret(key=privateKey.save_pkcs1().decode("utf-8"))
-            privateKey_instance.save()
-            env.value = encrypted_value.hex()
-            env.key_id = privateKey_instance
+            # Seal the new value with fresh key material, the old EnvSecret is
+            # removed once the env points at the new one
+            old_secret = env.key_id
+            env.value, env.key_id = seal_value(value)
+            if env.size is not None:
+                # The value is stored inline from now on
+                env.size = None
+                env.chunks.all().delete()
 
         if name:
             env.name = name
@@ -304,15 +630,18 @@ def update_env(request):
             env.description = description
 
         env.save()
+        secret_cache.invalidate(env.id)
+        if old_secret:
+            old_secret.delete()
 
         return JsonResponse(
             {
                 "message": "Successfully updated env",
-                data: {
+                "data": {
                     "id": env.id,
                     "name": env.name,
-                    "value": env.value,
-                    "user": env.user.email,
+                    "value": bytes(env.value).hex(),
+                    "user": user.email,
                     "description": env.description,
                     "access_password": env.access_password,
                 },
@@ -322,25 +651,19 @@ def update_env(request):
     return error_response("Invalid request method", 405)
 
 
+@query_budget(8)
 @csrf_exempt
+@jwt_required
 def delete_secret(request):
     if request.method == "DELETE":
         try:
-            token = request.COOKIES.get("session_token")
-
-            if not token:
-                return error_response("Authentication token is missing", 401)
-
-            payload = decode_jwt(token)
-            if not payload:
-                return error_response("Invalid token or token has expired", 401)
-
             id = request.GET.get("id")
             if id is None:
                 return error_response("Env id is missing", 400)
 
             env = Env.objects.get(id=id)
             env.delete()
+            secret_cache.invalidate(id)
             return JsonResponse(
                 {"message": "Successfully deleted env", "data": {"id": id}}
             )
@@ -352,3 +675,25 @@ def delete_secret(request):
             return error_response(str(e), 500)
 
     return error_response("Method not allowed", 405)
+
+
+@query_budget(3)
+@csrf_exempt
+@jwt_required
+def get_stats(request):
+    if request.method == "GET":
+        if not is_admin(request.principal):
+            return error_response("Admin access required", 403)
+
+        return JsonResponse(
+            {
+                "message": "Successfully fetched stats",
+                "data": {
+                    "rsa_key_pool": keypool.stats(),
+                    "secret_cache": secret_cache.stats(),
+                    "principal_cache": principal_cache.stats(),
+                },
+            }
+        )
+
+    return error_response("Invalid request method", 405)
@@ -0,0 +1,163 @@
+"""Executors for CPU bound crypto work.
+
+Pure-Python RSA holds the GIL, so decrypting many secrets in the request
+thread pins one core. Large batches are split into chunks and decrypted on a
+pool of spawned worker processes; results come back in input order. Bulk
+imports encrypt on the same pool, where workers generate RSA keys inline.
+
+Async views never run crypto on the event loop: decryption goes to the
+process pool and encryption, which needs the in-process RSA key pool, to a
+bounded thread pool.
+"""
+
+import asyncio
+import atexit
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import repeat
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from secret_manager.apps.envs import crypto, keypool
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_threads = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(
+                    max_workers=settings.DECRYPT_POOL_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=keypool.generate_inline,
+                )
+                atexit.register(reset_executor)
+    return _executor
+
+
+def get_thread_executor():
+    global _threads
+    if _threads is None:
+        with _executor_lock:
+            if _threads is None:
+                _threads = ThreadPoolExecutor(
+                    max_workers=settings.CRYPTO_THREADS, thread_name_prefix="crypto"
+                )
+    return _threads
+
+
+async def run_in_thread(fn, *args, **kwargs):
+    """Run ``fn`` on the bounded crypto thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_thread_executor(), partial(fn, *args, **kwargs))
+
+
+def reset_executor():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def decrypt_chunk(rows):
+    results = []
+    for row in rows:
+        try:
+            results.append((crypto.decrypt(*row), None))
+        except (crypto.CryptoError, ValueError) as e:
+            results.append((None, str(e)))
+    return results
+
+
+def seal_chunk(values, scheme):
+    """Encrypt ``values`` with ``scheme``, for bulk loads."""
+    return [crypto.encrypt(value, scheme=scheme) for value in values]
+
+
+def _chunks(items):
+    """Split ``items`` into pool sized chunks, spread over every worker."""
+    workers = settings.DECRYPT_POOL_WORKERS
+    size = max(1, min(settings.DECRYPT_POOL_CHUNK_SIZE, -(-len(items) // workers)))
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def seal_values(values, scheme=None):
+    """Encrypt ``values``, returning a ``Sealed`` tuple per value in order.
+
+    Large batches are split over the worker pool like ``decrypt_rows``, but
+    a value that fails to encrypt fails the whole batch.
+    """
+    values = list(values)
+    scheme = scheme or settings.ENV_ENCRYPTION_SCHEME
+    workers = settings.DECRYPT_POOL_WORKERS
+    if workers <= 0 or len(values) < settings.DECRYPT_POOL_MIN_ITEMS:
+        return seal_chunk(values, scheme)
+
+    try:
+        return [
+            sealed
+            for chunk in get_executor().map(seal_chunk, _chunks(values), repeat(scheme))
+            for sealed in chunk
+        ]
+    except BrokenProcessPool as e:
+        logger.warning(f"Crypto pool workers died, encrypting inline: {e}")
+        reset_executor()
+        return seal_chunk(values, scheme)
+
+
+def decrypt_rows(rows):
+    """Decrypt ``(value, key, scheme, key_version)`` rows.
+
+    Returns a ``(plaintext, error)`` pair per row, in the order given. A row
+    that fails to decrypt gets ``None`` and the error message instead of
+    failing the whole batch.
+    """
+    rows = list(rows)
+    workers = settings.DECRYPT_POOL_WORKERS
+    if workers <= 0 or len(rows) < settings.DECRYPT_POOL_MIN_ITEMS:
+        return decrypt_chunk(rows)
+
+    try:
+        return [
+            result
+            for chunk in get_executor().map(decrypt_chunk, _chunks(rows))
+            for result in chunk
+        ]
+    except BrokenProcessPool as e:
+        logger.warning(f"Decrypt pool workers died, decrypting inline: {e}")
+        reset_executor()
+        return decrypt_chunk(rows)
+
+
+async def adecrypt_rows(rows):
+    """Async version of ``decrypt_rows`` that always leaves the event loop."""
+    rows = list(rows)
+    if not rows:
+        return []
+    workers = settings.DECRYPT_POOL_WORKERS
+    if workers <= 0:
+        return await run_in_thread(decrypt_chunk, rows)
+
+    chunks = _chunks(rows)
+    loop = asyncio.get_running_loop()
+    try:
+        executor = get_executor()
+        results = await asyncio.gather(
+            *(loop.run_in_executor(executor, decrypt_chunk, chunk) for chunk in chunks)
+        )
+    except BrokenProcessPool as e:
+        logger.warning(f"Decrypt pool workers died, decrypting in a thread: {e}")
+        reset_executor()
+        return await run_in_thread(decrypt_chunk, rows)
+    return [result for chunk in results for result in chunk]
@@ -0,0 +1,151 @@
+"""Async versions of the user views, served when ``ASYNC_VIEWS`` is on.
+
+Password hashing runs on the crypto thread pool so the event loop stays
+responsive. Views that only do a single write are re-exported from
+``views``; Django runs those in a thread.
+"""
+
+import json
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+
+from secret_manager.apps.envs.workers import run_in_thread
+from secret_manager.apps.users.models import User
+from secret_manager.apps.users.views import (  # noqa: F401
+    USER_LIST_FIELDS,
+    delete_user,
+    logout,
+    registered_response,
+    session_response,
+    set_admin,
+    set_moderator,
+    update_user,
+)
+from secret_manager.auth import async_jwt_required, principal_cache
+from secret_manager.db_router import pinned
+from secret_manager.querybudget import query_budget
+from secret_manager.utili import apaginate, page_params, stream_format, stream_response
+
+
+@query_budget(3)
+@csrf_exempt
+async def register(request):
+    if request.method == "POST":
+        try:
+            data = json.loads(request.body)
+            username = data.get("username")
+            email = data.get("email")
+
+            if (
+                await User.objects.filter(email=email).aexists()
+                or await User.objects.filter(username=username).aexists()
+            ):
+                return JsonResponse(
+                    {"error": "User with this email or username already exists"},
+                    status=409,
+                )
+
+            user = User(
+                username=username,
+                email=email,
+                password=await run_in_thread(make_password, data.get("password")),
+                firstname=data.get("firstname"),
+                lastname=data.get("lastname"),
+                contact=data.get("contact"),
+                lastLogin=timezone.now(),
+            )
+            await user.asave()
+
+            return registered_response(user)
+        except ValidationError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        except IntegrityError:
+            return JsonResponse({"error": "Failed to create user"}, status=500)
+        except Exception as e:
+            return JsonResponse({"error": str(e)}, status=500)
+    else:
+        return JsonResponse({"error": "Invalid request method"}, status=405)
+
+
+@query_budget(2)
+@csrf_exempt
+@async_jwt_required
+async def get_user(request):
+    if request.method == "GET":
+        user = request.principal
+        return JsonResponse(
+            {
+                "message": "Successfully fetched user",
+                "data": {"username": user.username, "email": user.email},
+            }
+        )
+    else:
+        return JsonResponse({"error": "Invalid request method"}, status=405)
+
+
+@query_budget(1)
+async def get_users(request):
+    if request.method == "GET":
+        try:
+            users = User.objects.values(*USER_LIST_FIELDS)
+            fmt = stream_format(request)
+            if fmt:
+                rows = pinned(users.order_by("createdAt", "id")).aiterator(
+                    chunk_size=settings.STREAM_CHUNK_SIZE
+                )
+                return stream_response("Successfully fetched all users", rows, fmt)
+
+            cursor, limit = page_params(request)
+            rows, next_cursor = await apaginate(users, cursor, limit)
+            return JsonResponse(
+                {
+                    "message": "Successfully fetched all users",
+                    "data": rows,
+                    "next_cursor": next_cursor,
+                }
+            )
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        except Exception as e:
+            return JsonResponse({"error": str(e)}, status=500)
+    else:
+        return JsonResponse({"error": "Invalid request method"}, status=405)
+
+
+@query_budget(2)
+@csrf_exempt
+async def login(request):
+    if request.method == "POST":
+        data = json.loads(request.body)
+
+        try:
+            user = await User.objects.aget(email=data.get("email"))
+        except User.DoesNotExist:
+            return JsonResponse({"error": "User not found"}, status=404)
+
+        if not await run_in_thread(check_password, data.get("password"), user.password):
+            return JsonResponse({"error": "Invalid password"}, status=401)
+
+        user.lastLogin = timezone.now()
+        await user.asave()
+        principal_cache.invalidate(user.id)
+
+        return session_response(user)
+    else:
+        return JsonResponse({"error": "Invalid request method"}, status=405)
+
+
+@query_budget(2)
+@csrf_exempt
+@async_jwt_required
+async def refresh(request):
+    if request.method == "GET":
+        return session_response(request.principal)
+    else:
+        return JsonResponse({"error": "Invalid request method"}, status=405)
@@ -0,0 +1,17 @@
+# Generated by Django 5.1 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_alter_user_contact_alter_user_role'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['createdAt', 'id'], name='user_created_id_idx'),
+        ),
+    ]
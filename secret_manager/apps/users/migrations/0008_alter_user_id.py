@@ -0,0 +1,19 @@
+# Generated by Django 5.1 on 2026-10-18 20:05
+
+import secret_manager.utili
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='id',
+            field=models.UUIDField(default=secret_manager.utili.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
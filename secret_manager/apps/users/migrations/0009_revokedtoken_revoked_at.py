@@ -0,0 +1,19 @@
+# Generated by Django 5.1 on 2026-10-18 23:10
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_alter_user_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='revokedtoken',
+            name='revoked_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), db_index=True),
+        ),
+    ]
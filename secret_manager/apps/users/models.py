@@ -1,6 +1,8 @@
 from django.db import models
+from django.db.models.functions import Now
 from django.utils import timezone
-from uuid import uuid4
+
+from secret_manager.utili import uuid7
 
 
 class User(models.Model):
@@ -10,7 +12,7 @@ class User(models.Model):
         ("moderator", "Moderator"),
     ]
 
-    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     username = models.CharField(max_length=100, unique=True)
     email = models.EmailField(unique=True)
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default="user")
@@ -24,5 +26,21 @@ class User(models.Model):
     createdAt = models.DateTimeField(auto_now_add=True)
     updatedAt = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["createdAt", "id"], name="user_created_id_idx")
+        ]
+
     def __str__(self):
         return f"{self.username} ({self.email}) ({self.role})"
+
+
+class RevokedToken(models.Model):
+    jti = models.CharField(max_length=32, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    # Set by the database clock so that processes can pick up new rows by
+    # time, see ``revocation``
+    revoked_at = models.DateTimeField(db_default=Now(), db_index=True)
+
+    def __str__(self):
+        return self.jti
@@ -1,17 +1,32 @@
+from django.conf import settings
 from django.urls import path
 
-from secret_manager.apps.users.views import (
-    register,
-    delete_user,
-    get_user,
-    get_users,
-    login,
-    update_user,
-    set_admin,
-    set_moderator,
-    refresh,
-    logout,
-)
+if settings.ASYNC_VIEWS:
+    from secret_manager.apps.users.async_views import (
+        register,
+        delete_user,
+        get_user,
+        get_users,
+        login,
+        update_user,
+        set_admin,
+        set_moderator,
+        refresh,
+        logout,
+    )
+else:
+    from secret_manager.apps.users.views import (
+        register,
+        delete_user,
+        get_user,
+        get_users,
+        login,
+        update_user,
+        set_admin,
+        set_moderator,
+        refresh,
+        logout,
+    )
 
 urlpatterns = [
     # /users/adduser/?username=lakshay
@@ -1,5 +1,8 @@
 import json
+from datetime import datetime
+from datetime import timezone as dt_timezone
 
+from django.conf import settings
 from django.contrib.auth.hashers import check_password, make_password
 from django.http import JsonResponse
 from django.utils import timezone
@@ -8,9 +11,78 @@ from django.core.exceptions import ValidationError
 from django.db import IntegrityError
 
 from secret_manager.apps.users.models import User
-from secret_manager.utili import decode_jwt, generate_jwt
-
-
+from secret_manager.auth import jwt_required, principal_cache
+from secret_manager.db_router import pinned
+from secret_manager.querybudget import query_budget
+from secret_manager.revocation import revocations
+from secret_manager.utili import (
+    decode_jwt,
+    generate_jwt,
+    page_params,
+    paginate,
+    stream_format,
+    stream_response,
+)
+
+USER_LIST_FIELDS = (
+    "id",
+    "username",
+    "email",
+    "role",
+    "contact",
+    "lastLogin",
+    "createdAt",
+    "updatedAt",
+)
+
+
+def registered_response(user):
+    token = generate_jwt(user)
+
+    response = JsonResponse(
+        {
+            "message": "User created successfully",
+            "data": {
+                "username": user.username,
+                "email": user.email,
+            },
+            "token": token,
+        }
+    )
+
+    response.set_cookie(key="session_token", value=token, httponly=True)
+    return response
+
+
+def session_response(user):
+    """Issue a new session token for ``user`` and set it as the cookie."""
+    token = generate_jwt(user)
+
+    response = JsonResponse(
+        {
+            "message": "User authenticated successfully",
+            "data": {
+                "id": user.id,
+                "username": user.username,
+                "email": user.email,
+                "firstname": user.firstname,
+            },
+            "token": token,
+        }
+    )
+
+    response.set_cookie(
+        key="session_token",
+        value=token,
+        httponly=True,
+        samesite="Lax",
+        secure=False,  # Use secure=True in production with HTTPS
+    )
+
+    return response
+
+
+@query_budget(2)
 @csrf_exempt
 def set_admin(request):
     if request.method == "POST":
@@ -40,6 +112,7 @@ def set_admin(request):
         return JsonResponse({"error": "Invalid request method"}, status=405)
 
 
+@query_budget(2)
 @csrf_exempt
 def set_moderator(request):
     if request.method == "POST":
@@ -77,6 +150,7 @@ def set_moderator(request):
         return JsonResponse({"error": "Invalid request method"}, status=405)
 
 
+@query_budget(3)
 @csrf_exempt
 def register(request):
     if request.method == "POST":
@@ -111,21 +185,7 @@ def register(request):
             )
             user.save()
 
-            token = generate_jwt(user)
-
-            response = JsonResponse(
-                {
-                    "message": "User created successfully",
-                    "data": {
-                        "username": user.username,
-                        "email": user.email,
-                    },
-                    "token": token,
-                }
-            )
-
-            response.set_cookie(key="session_token", value=token, httponly=True)
-            return response
+            return registered_response(user)
         except ValidationError as e:
             return JsonResponse({"error": str(e)}, status=400)
         except IntegrityError:
@@ -136,64 +196,52 @@ def register(request):
         return JsonResponse({"error": "Invalid request method"}, status=405)
 
 
+@query_budget(2)
 @csrf_exempt
+@jwt_required
 def get_user(request):
     if request.method == "GET":
-        token = request.COOKIES.get("session_token")
-
-        if not token:
-            return JsonResponse(
-                {"error": "Authentication token is missing"}, status=401
-            )
-
-        payload = decode_jwt(token)
-        if not payload:
-            return JsonResponse(
-                {"error": "Invalid token or token has expired"}, status=401
-            )
-
-        try:
-            user = User.objects.get(id=payload["id"])
-            return JsonResponse(
-                {
-                    "message": "Successfully fetched user",
-                    "data": {"username": user.username, "email": user.email},
-                }
-            )
-        except User.DoesNotExist:
-            return JsonResponse({"error": "User not found"}, status=404)
-        except Exception as e:
-            return JsonResponse({"error": str(e)}, status=500)
+        user = request.principal
+        return JsonResponse(
+            {
+                "message": "Successfully fetched user",
+                "data": {"username": user.username, "email": user.email},
+            }
+        )
     else:
         return JsonResponse({"error": "Invalid request method"}, status=405)
 
 
+@query_budget(1)
 def get_users(request):
     if request.method == "GET":
         try:
-            users = User.objects.all()
-            user_list = [
+            users = User.objects.values(*USER_LIST_FIELDS)
+            fmt = stream_format(request)
+            if fmt:
+                rows = pinned(users.order_by("createdAt", "id")).iterator(
+                    chunk_size=settings.STREAM_CHUNK_SIZE
+                )
+                return stream_response("Successfully fetched all users", rows, fmt)
+
+            cursor, limit = page_params(request)
+            rows, next_cursor = paginate(users, cursor, limit)
+            return JsonResponse(
                 {
-                    "id": user.id,
-                    "username": user.username,
-                    "email": user.email,
-                    "role": user.role,
-                    "contact": user.contact,
-                    "lastLogin": user.lastLogin,
-                    "createdAt": user.createdAt,
-                    "updatedAt": user.updatedAt,
+                    "message": "Successfully fetched all users",
+                    "data": rows,
+                    "next_cursor": next_cursor,
                 }
-                for user in users
-            ]
-            return JsonResponse(
-                {"message": "Successfully fetched all users", "data": user_list}
             )
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
     else:
         return JsonResponse({"error": "Invalid request method"}, status=405)
 
 
+@query_budget(2)
 @csrf_exempt
 def login(request):
     if request.method == "POST":
@@ -211,107 +259,50 @@ def login(request):
 
         user.lastLogin = timezone.now()
         user.save()
+        principal_cache.invalidate(user.id)
 
-        token = generate_jwt(user)
-
-        response = JsonResponse(
-            {
-                "message": "User authenticated successfully",
-                "data": {
-                    "id": user.id,
-                    "username": user.username,
-                    "email": user.email,
-                    "firstname": user.firstname,
-                },
-                "token": token,
-            }
-        )
-
-        response.set_cookie(
-            key="session_token",
-            value=token,
-            httponly=True,
-            samesite="Lax",
-            secure=False,  # Use secure=True in production with HTTPS
-        )
-
-        return response
+        return session_response(user)
     else:
         return JsonResponse({"error": "Invalid request method"}, status=405)
 
 
+@query_budget(2)
 @csrf_exempt
+@jwt_required
 def refresh(request):
     if request.method == "GET":
-        token = request.COOKIES.get("session_token")
-        if not token:
-            return JsonResponse(
-                {"error": "Authentication token is missing"}, status=401
-            )
-
-        payload = decode_jwt(token)
-        if not payload:
-            return JsonResponse(
-                {"error": "Invalid token or token has expired"}, status=401
-            )
-
-        user = User.objects.get(id=payload["id"])
-        if not user:
-            return JsonResponse({"error": "Unauthenticated token"}, status=404)
-
-        token = generate_jwt(user)
-        response = JsonResponse(
-            {
-                "message": "User authenticated successfully",
-                "data": {
-                    "id": user.id,
-                    "username": user.username,
-                    "email": user.email,
-                    "firstname": user.firstname,
-                },
-                "token": token,
-            }
-        )
-        response.set_cookie(
-            key="session_token",
-            value=token,
-            httponly=True,
-            samesite="Lax",
-            secure=False,  # Use secure=True in production with HTTPS
-        )
-        return response
+        return session_response(request.principal)
     else:
         return JsonResponse({"error": "Invalid request method"}, status=405)
 
 
+@query_budget(2)
+@csrf_exempt
 def logout(request):
     if request.method != "GET":
+        token = request.COOKIES.get("session_token")
+        payload = decode_jwt(token) if token else None
+        if payload and "jti" in payload:
+            revocations.revoke(
+                payload["jti"],
+                datetime.fromtimestamp(payload["exp"], tz=dt_timezone.utc),
+            )
+
         response = JsonResponse({"message": "User logged out successfully"})
         response.delete_cookie("session_token")
         return response
 
 
+@query_budget(4)
 @csrf_exempt
+@jwt_required
 def update_user(request):
     if request.method == "PUT":
         try:
             data = json.loads(request.body)
-            token = request.COOKIES.get("session_token")
 
-            if not token:
-                return JsonResponse(
-                    {"error": "Authentication token is missing"}, status=401
-                )
-
-            payload = decode_jwt(token)
-            if not payload:
-                return JsonResponse(
-                    {"error": "Invalid token or token has expired"}, status=401
-                )
-
-            id = payload["id"]
-
-            user = User.objects.get(id=id)
+            # Load the row itself, the cached principal may be stale
+            user = User.objects.get(id=request.principal.id)
 
             # Update fields if they are provided
             if "username" in data:
@@ -330,6 +321,7 @@ def update_user(request):
             user.updatedAt = timezone.now()
             # Save the updated user object
             user.save()
+            principal_cache.invalidate(user.id)
 
             return JsonResponse(
                 {
@@ -354,6 +346,7 @@ def update_user(request):
         return JsonResponse({"error": "Invalid request method"}, status=405)
 
 
+@query_budget(5)
 @csrf_exempt
 def delete_user(request):
     if request.method == "DELETE":
@@ -361,6 +354,7 @@ def delete_user(request):
             id = request.GET.get("id")
             user = User.objects.get(id=id)
             user.delete()
+            principal_cache.invalidate(id)
             return JsonResponse({"message": "User deleted successfully"})
         except User.DoesNotExist:
             return JsonResponse({"error": "User not found"}, status=404)
@@ -5,6 +5,18 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+Set ``ASYNC_VIEWS=1`` to route the API to the native async views, then serve
+this application with an ASGI server, for example::
+
+    ASYNC_VIEWS=1 uvicorn secret_manager.asgi:application \
+        --host 0.0.0.0 --port 8000 --workers 4
+
+Each worker runs one event loop. Crypto is offloaded to
+``DECRYPT_POOL_WORKERS`` decryption processes and ``CRYPTO_THREADS``
+encryption threads per worker, so size those so that workers times pools
+roughly matches the available cores. Load-test it against the WSGI setup
+(``python manage.py runserver``) with the same routes and concurrency.
 """
 
 import os
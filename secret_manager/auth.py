@@ -0,0 +1,155 @@
+"""Session token authentication shared by the env and user views.
+
+``jwt_required`` resolves the ``session_token`` cookie to a ``User`` once per
+request and attaches it as ``request.principal``. User rows are kept in a
+short-lived, size-bounded per-process cache so authenticated calls do not
+need a database round trip; ``update_user`` and ``delete_user`` invalidate
+their entry in the process that handles them only. Other processes keep
+serving a changed or deleted user for up to ``PRINCIPAL_CACHE_TTL`` seconds,
+so admin-only views check the role against the database with ``is_admin``.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+
+from secret_manager.apps.users.models import User
+from secret_manager.metrics import cache_lookup
+from secret_manager.utili import decode_jwt
+
+
+class PrincipalCache:
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Return a copy of the cached user with ``user_id`` or ``None``."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= time.monotonic():
+                self._entries.pop(user_id, None)
+                self.misses += 1
+                cache_lookup("principal", hit=False)
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            cache_lookup("principal", hit=True)
+            return copy.copy(entry[1])
+
+    def set(self, user):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[str(user.id)] = (time.monotonic() + self.ttl, copy.copy(user))
+            self._entries.move_to_end(str(user.id))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+principal_cache = PrincipalCache(
+    max_size=settings.PRINCIPAL_CACHE_SIZE, ttl=settings.PRINCIPAL_CACHE_TTL
+)
+
+
+def get_principal(user_id):
+    user = principal_cache.get(user_id)
+    if user is None:
+        user = User.objects.get(id=user_id)
+        principal_cache.set(user)
+    return user
+
+
+async def aget_principal(user_id):
+    user = principal_cache.get(user_id)
+    if user is None:
+        user = await User.objects.aget(id=user_id)
+        principal_cache.set(user)
+    return user
+
+
+def is_admin(principal):
+    """Whether ``principal`` is an admin now, read from the database."""
+    return User.objects.filter(id=principal.id, role="admin").exists()
+
+
+def jwt_required(view):
+    """Reject requests without a valid session token for an existing user."""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = request.COOKIES.get("session_token")
+        if not token:
+            return JsonResponse(
+                {"error": "Authentication token is missing"}, status=401
+            )
+
+        payload = decode_jwt(token)
+        if not payload:
+            return JsonResponse(
+                {"error": "Invalid token or token has expired"}, status=401
+            )
+
+        try:
+            request.principal = get_principal(payload["id"])
+        except User.DoesNotExist:
+            return JsonResponse({"error": "User not found"}, status=404)
+        request.jwt_payload = payload
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def async_jwt_required(view):
+    """Async version of ``jwt_required``."""
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        token = request.COOKIES.get("session_token")
+        if not token:
+            return JsonResponse(
+                {"error": "Authentication token is missing"}, status=401
+            )
+
+        # decode_jwt may refresh the revocation list from the database
+        payload = await sync_to_async(decode_jwt)(token)
+        if not payload:
+            return JsonResponse(
+                {"error": "Invalid token or token has expired"}, status=401
+            )
+
+        try:
+            request.principal = await aget_principal(payload["id"])
+        except User.DoesNotExist:
+            return JsonResponse({"error": "User not found"}, status=404)
+        request.jwt_payload = payload
+        return await view(request, *args, **kwargs)
+
+    return wrapper
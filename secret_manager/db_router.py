@@ -0,0 +1,113 @@
+"""Send reads to the read replicas and writes to the primary.
+
+Replicas are the extra databases configured from ``REPLICA*_DATABASE_URL``
+env vars (``settings.REPLICA_DATABASES``). Without any, everything goes to
+``default``.
+
+Replicas lag behind the primary, so requests that may write read from the
+primary: POST, PUT, PATCH and DELETE requests from their start, other
+requests after their first write or inside a transaction. A client that has
+just written keeps reading from the primary for ``READ_YOUR_WRITES_SECONDS``
+afterwards through a cookie set by ``read_your_writes_middleware``.
+
+The routing state ends with the view. Querysets that a streaming response
+evaluates later are bound with ``pinned`` while the view runs, and large
+secret chunks are read from the database their env was loaded from.
+
+``python manage.py check_replica_routing`` checks these rules.
+"""
+
+import contextvars
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+
+PRIMARY_COOKIE = "db_primary_until"
+
+# Methods that only read. Anything else reads from the primary from the
+# start, so a read-modify-write never works on a lagging copy of the row.
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Per-request routing state. A mutable dict so that a write deep inside the
+# ORM is visible to the middleware.
+_request_state = contextvars.ContextVar("db_request_state", default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.REPLICA_DATABASES
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        state = _request_state.get()
+        if (state and state["primary"]) or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state["primary"] = state["wrote"] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def pinned(queryset):
+    """Bind ``queryset`` to the database the router picks for it now.
+
+    For querysets evaluated after the view returns, such as the rows of a
+    streaming response, when the request's routing state is already gone.
+    """
+    return queryset.using(queryset.db)
+
+
+def _start(request):
+    try:
+        until = float(request.COOKIES.get(PRIMARY_COOKIE, 0))
+    except ValueError:
+        until = 0
+    primary = request.method not in READ_METHODS or until > time.time()
+    return _request_state.set({"primary": primary, "wrote": False})
+
+
+def _finish(request, response, token):
+    # Reads may write in passing (quota flushes); only pin the client after
+    # requests that are meant to change something
+    wrote = _request_state.get()["wrote"] and request.method not in READ_METHODS
+    _request_state.reset(token)
+    if wrote and settings.REPLICA_DATABASES:
+        seconds = settings.READ_YOUR_WRITES_SECONDS
+        response.set_cookie(
+            PRIMARY_COOKIE,
+            str(time.time() + seconds),
+            max_age=seconds,
+            httponly=True,
+            samesite="Lax",
+        )
+    return response
+
+
+@sync_and_async_middleware
+def read_your_writes_middleware(get_response):
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            token = _start(request)
+            return _finish(request, await get_response(request), token)
+
+    else:
+
+        def middleware(request):
+            token = _start(request)
+            return _finish(request, get_response(request), token)
+
+    return middleware
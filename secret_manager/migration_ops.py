@@ -0,0 +1,62 @@
+"""Migration operations for changing large tables on PostgreSQL.
+
+PostgreSQL can do the slow part of most constraint changes without blocking
+the table: ``CREATE INDEX CONCURRENTLY``, foreign keys and checks added
+``NOT VALID`` and validated later. Migrations run that SQL ahead of time in a
+non-atomic stage with ``PostgresOnly`` and then swap the schema with
+``PreparedOnPostgres``, which replaces Django's own DDL with the short
+statements left to run. Other databases get the plain Django operations.
+"""
+
+from django.db import migrations
+from django.db.migrations.operations.base import Operation
+
+
+def is_postgres(schema_editor):
+    return schema_editor.connection.vendor == "postgresql"
+
+
+class PostgresOnly(migrations.RunSQL):
+    """``RunSQL`` that is skipped on other databases."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if is_postgres(schema_editor):
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if is_postgres(schema_editor):
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class PreparedOnPostgres(Operation):
+    """Apply ``operation``, running ``sql`` instead of its DDL on PostgreSQL.
+
+    For schema changes whose indexes and constraints were already built by a
+    ``PostgresOnly`` stage. Migrating backwards runs the operation's own DDL.
+    """
+
+    reversible = True
+
+    def __init__(self, operation, sql=()):
+        self.operation = operation
+        self.sql = list(sql)
+
+    def state_forwards(self, app_label, state):
+        self.operation.state_forwards(app_label, state)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not is_postgres(schema_editor):
+            self.operation.database_forwards(app_label, schema_editor, from_state, to_state)
+            return
+        for statement in self.sql:
+            schema_editor.execute(statement, params=None)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        self.operation.database_backwards(app_label, schema_editor, from_state, to_state)
+
+    def describe(self):
+        return f"{self.operation.describe()} (prepared on PostgreSQL)"
+
+    @property
+    def migration_name_fragment(self):
+        return self.operation.migration_name_fragment
@@ -0,0 +1,154 @@
+"""Opt-in request profiling and the slow-request log.
+
+A request is profiled with cProfile when it carries
+``X-Profile: <PROFILE_TOKEN>`` or is picked by ``PROFILE_SAMPLE_RATE``. The
+profile is written to ``PROFILE_DIR`` as ``<name>.prof`` (pstats format) next
+to ``<name>.json`` with the route, timings and SQL totals. Only the newest
+``PROFILE_MAX_DUMPS`` are kept; admins fetch them from ``/profiles/``.
+
+Only one request per process is profiled at a time, others run normally.
+Requests slower than ``SLOW_REQUEST_MS`` are logged as one JSON line on the
+``secret_manager.slow_requests`` logger whether or not they were profiled.
+"""
+
+import cProfile
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils import timezone
+from django.utils.decorators import sync_and_async_middleware
+
+from secret_manager.metrics import query_stats
+
+logger = logging.getLogger("secret_manager.slow_requests")
+
+# cProfile cannot run two profilers at once
+_profiler_lock = threading.Lock()
+
+
+def profile_dir():
+    return Path(settings.PROFILE_DIR)
+
+
+def list_dumps():
+    """Return the metadata of the stored profiles, newest first."""
+    dumps = []
+    for path in sorted(profile_dir().glob("*.json"), reverse=True):
+        try:
+            dumps.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return dumps
+
+
+def dump_path(name):
+    """Return the ``.prof`` path of the dump ``name`` or ``None``."""
+    path = profile_dir() / f"{name}.prof"
+    # Names are generated by us; anything else is not a dump
+    if path.parent != profile_dir() or not path.is_file():
+        return None
+    return path
+
+
+def _wants_profile(request):
+    token = settings.PROFILE_TOKEN
+    if token and request.headers.get("X-Profile") == token:
+        return True
+    rate = settings.PROFILE_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+def _start(request):
+    profiler = None
+    if _wants_profile(request) and _profiler_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiling tool is active in this process
+            _profiler_lock.release()
+            profiler = None
+    return time.perf_counter(), profiler
+
+
+def _stop(profiler):
+    if profiler is not None:
+        profiler.disable()
+        _profiler_lock.release()
+
+
+def _finish(request, response, started):
+    start, profiler = started
+    _stop(profiler)
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    queries, db_seconds = query_stats()
+    match = getattr(request, "resolver_match", None)
+    principal = getattr(request, "principal", None)
+    entry = {
+        "time": timezone.now().isoformat(),
+        "method": request.method,
+        "route": match.route if match else None,
+        "path": request.path,
+        "status": response.status_code,
+        "duration_ms": round(elapsed_ms, 3),
+        "db_queries": queries,
+        "db_ms": round(db_seconds * 1000, 3),
+        "user": str(principal.id) if principal else None,
+    }
+
+    if profiler is not None:
+        try:
+            entry["profile"] = _save(profiler, entry)
+        except OSError as e:
+            logger.error(f"Could not save request profile: {e}")
+    if elapsed_ms >= settings.SLOW_REQUEST_MS:
+        logger.warning(json.dumps(entry))
+    return response
+
+
+def _save(profiler, entry):
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    profiler.dump_stats(directory / f"{name}.prof")
+    (directory / f"{name}.json").write_text(json.dumps({"name": name, **entry}))
+
+    for stale in sorted(directory.glob("*.json"))[: -settings.PROFILE_MAX_DUMPS]:
+        stale.unlink(missing_ok=True)
+        stale.with_suffix(".prof").unlink(missing_ok=True)
+    return name
+
+
+@sync_and_async_middleware
+def profiling_middleware(get_response):
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            started = _start(request)
+            try:
+                response = await get_response(request)
+            except BaseException:
+                _stop(started[1])
+                raise
+            return _finish(request, response, started)
+
+    else:
+
+        def middleware(request):
+            started = _start(request)
+            try:
+                response = get_response(request)
+            except BaseException:
+                _stop(started[1])
+                raise
+            return _finish(request, response, started)
+
+    return middleware
@@ -0,0 +1,136 @@
+"""Per-view SQL query budgets and N+1 detection.
+
+Views declare the most queries a request may run with ``@query_budget(n)``,
+counting a cold principal cache and a revocation list refresh. In
+development ``query_budget_middleware`` records the SQL of every request and
+reports when a view goes over its budget or runs the same statement
+``QUERY_REPEAT_LIMIT`` or more times, the usual sign of an N+1. Reports are
+logged (``QUERY_BUDGETS = "warn"``) or raised (``"raise"``).
+
+``python manage.py check_query_budgets`` drives every API route and fails on
+any violation or a route without a budget.
+"""
+
+import contextvars
+import logging
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+MODE_OFF = "off"
+MODE_WARN = "warn"
+MODE_RAISE = "raise"
+
+# SQL statements run by the current request while recording
+_statements = contextvars.ContextVar("query_statements", default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(queries):
+    """Declare the most SQL queries one request to the view may run."""
+
+    def decorator(view):
+        view.query_budget = queries
+        return view
+
+    return decorator
+
+
+def _record_query(execute, sql, params, many, context):
+    statements = _statements.get()
+    # SQLite starts transactions with a BEGIN statement, other backends
+    # don't send one; leave it out so budgets hold on every backend
+    if statements is not None and sql != "BEGIN":
+        statements.append(sql)
+    return execute(sql, params, many, context)
+
+
+def _install_recorder(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(_install_recorder)
+
+
+def start_recording():
+    return _statements.set([])
+
+
+def stop_recording(token):
+    statements = _statements.get()
+    _statements.reset(token)
+    return statements
+
+
+@contextmanager
+def unbudgeted():
+    """Leave the queries run inside out of the request's budget.
+
+    For writes whose count grows with the size of the payload by design,
+    such as the chunks of a large secret.
+    """
+    token = _statements.set(None)
+    try:
+        yield
+    finally:
+        _statements.reset(token)
+
+
+def violations(view, statements):
+    """Return the problems with ``statements`` run by one request to ``view``."""
+    problems = []
+    budget = getattr(view, "query_budget", None)
+    if budget is not None and len(statements) > budget:
+        problems.append(f"ran {len(statements)} queries, budget is {budget}")
+
+    for sql, count in Counter(statements).items():
+        if count >= settings.QUERY_REPEAT_LIMIT:
+            problems.append(f"ran the same query {count} times (N+1?): {sql}")
+    return problems
+
+
+def _finish(request, response, token):
+    statements = stop_recording(token)
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return response
+
+    response["X-Query-Count"] = str(len(statements))
+    problems = violations(match.func, statements)
+    if problems:
+        message = f"{request.method} {request.path}: " + "; ".join(problems)
+        if settings.QUERY_BUDGETS == MODE_RAISE:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+    return response
+
+
+@sync_and_async_middleware
+def query_budget_middleware(get_response):
+    if settings.QUERY_BUDGETS == MODE_OFF:
+        raise MiddlewareNotUsed
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            token = start_recording()
+            return _finish(request, await get_response(request), token)
+
+    else:
+
+        def middleware(request):
+            token = start_recording()
+            return _finish(request, get_response(request), token)
+
+    return middleware
@@ -0,0 +1,132 @@
+"""Revoked session tokens.
+
+Revoked token ids (``jti``) are stored in the ``RevokedToken`` table. Every
+process mirrors the unexpired ones in a Bloom filter backed by an exact set,
+and picks up rows revoked elsewhere by reading only the rows revoked since
+its last refresh. A token that is not in the filter, which is nearly every
+token, is accepted without touching the database or the exact set.
+
+New rows are found by ``revoked_at``, set by the database when the row is
+inserted. A row can commit after rows with a later ``revoked_at`` (or a
+higher id), so every refresh re-reads the last ``overlap`` seconds before
+the newest row it has seen.
+"""
+
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from secret_manager.apps.users.models import RevokedToken
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+class RevocationStore:
+    def __init__(self, capacity, error_rate, refresh_interval, rebuild_interval, overlap):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.overlap = timedelta(seconds=overlap)
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._exact = set()
+        self._last_seen = None
+        self._refreshed_at = None
+        self._rebuilt_at = None
+        self._lock = threading.Lock()
+
+    def is_revoked(self, jti):
+        self.refresh()
+        if jti not in self._bloom:
+            return False
+        return jti in self._exact
+
+    def revoke(self, jti, expires_at):
+        # One INSERT, revoking an already revoked token is a no-op
+        RevokedToken.objects.bulk_create(
+            [RevokedToken(jti=jti, expires_at=expires_at)], ignore_conflicts=True
+        )
+        with self._lock:
+            self._bloom.add(jti)
+            self._exact.add(jti)
+
+    def expire(self):
+        """Make the next ``is_revoked`` refresh from the database first."""
+        self._refreshed_at = None
+
+    def refresh(self, force=False):
+        """Load tokens revoked since the last refresh.
+
+        Runs at most once per ``refresh_interval``; the filter is rebuilt from
+        scratch every ``rebuild_interval`` to drop expired tokens.
+        """
+        now = time.monotonic()
+        if (
+            not force
+            and self._refreshed_at is not None
+            and now - self._refreshed_at < self.refresh_interval
+        ):
+            return
+        # Other threads keep using the current filter while one refreshes
+        if not self._lock.acquire(blocking=self._refreshed_at is None):
+            return
+        try:
+            rebuild = (
+                self._rebuilt_at is None
+                or now - self._rebuilt_at >= self.rebuild_interval
+                or len(self._exact) > self.capacity
+            )
+            if rebuild:
+                bloom, exact, last_seen = BloomFilter(self.capacity, self.error_rate), set(), None
+            else:
+                bloom, exact, last_seen = self._bloom, self._exact, self._last_seen
+
+            rows = RevokedToken.objects.filter(expires_at__gt=timezone.now())
+            if last_seen is not None:
+                rows = rows.filter(revoked_at__gte=last_seen - self.overlap)
+            for revoked_at, jti in rows.values_list("revoked_at", "jti").iterator():
+                bloom.add(jti)
+                exact.add(jti)
+                last_seen = revoked_at if last_seen is None else max(last_seen, revoked_at)
+
+            self._bloom, self._exact, self._last_seen = bloom, exact, last_seen
+            self._refreshed_at = now
+            if rebuild:
+                self._rebuilt_at = now
+        finally:
+            self._lock.release()
+
+
+revocations = RevocationStore(
+    capacity=settings.REVOCATION_BLOOM_CAPACITY,
+    error_rate=settings.REVOCATION_BLOOM_ERROR_RATE,
+    refresh_interval=settings.REVOCATION_REFRESH_SECONDS,
+    rebuild_interval=settings.REVOCATION_REBUILD_SECONDS,
+    overlap=settings.REVOCATION_OVERLAP_SECONDS,
+)
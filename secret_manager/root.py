@@ -1,8 +1,66 @@
-from django.http import JsonResponse
-from secret_manager.utili import unique_id
+from django.conf import settings
+from django.db import connection
+from django.http import FileResponse, HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from secret_manager import metrics, profiling
+from secret_manager.auth import is_admin, jwt_required
 
 
 def root(request):
     if request.method == "GET":
-        unique_id()
         return JsonResponse({"message": "Jai Mata Di"})
+
+
+def healthz(request):
+    """Liveness: the process is up and serving requests."""
+    return JsonResponse({"status": "ok"})
+
+
+def readyz(request):
+    """Readiness: the database is reachable."""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except Exception as e:
+        return JsonResponse({"status": "unavailable", "error": str(e)}, status=503)
+    return JsonResponse({"status": "ok"})
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, behind ``METRICS_TOKEN`` when it is set."""
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return JsonResponse({"error": "Unauthorized"}, status=401)
+    body, content_type = metrics.render()
+    return HttpResponse(body, content_type=content_type)
+
+
+@csrf_exempt
+@jwt_required
+def profiles(request):
+    if request.method == "GET":
+        if not is_admin(request.principal):
+            return JsonResponse({"error": "Admin access required"}, status=403)
+
+        return JsonResponse(
+            {"message": "Successfully fetched profiles", "data": profiling.list_dumps()}
+        )
+
+    return JsonResponse({"error": "Invalid request method"}, status=405)
+
+
+@csrf_exempt
+@jwt_required
+def profile(request, name):
+    """Download a profile; load it with ``pstats.Stats(path)``."""
+    if request.method == "GET":
+        if not is_admin(request.principal):
+            return JsonResponse({"error": "Admin access required"}, status=403)
+
+        path = profiling.dump_path(name)
+        if path is None:
+            return JsonResponse({"error": "Profile not found"}, status=404)
+        return FileResponse(path.open("rb"), as_attachment=True, filename=path.name)
+
+    return JsonResponse({"error": "Invalid request method"}, status=405)
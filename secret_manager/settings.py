@@ -11,10 +11,11 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 from pathlib import Path
-from urllib.parse import urlparse
 import os
 import dotenv
 
+from secret_manager.db import database_config
+
 dotenv.load_dotenv()
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -31,10 +32,111 @@ JWT_SECRET_KEY = SECRET_KEY
 JWT_ALGORITHM = "HS256"
 JWT_EXP_DELTA_SECONDS = 3000  # 5 minutes
 
+# Revoked token ids are mirrored per process in a Bloom filter. New
+# revocations from other processes are picked up every
+# REVOCATION_REFRESH_SECONDS, re-reading the last REVOCATION_OVERLAP_SECONDS
+# of revocations to catch rows that committed late, and the filter is
+# rebuilt every REVOCATION_REBUILD_SECONDS to drop expired tokens.
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))
+REVOCATION_REFRESH_SECONDS = int(os.getenv("REVOCATION_REFRESH_SECONDS", "5"))
+REVOCATION_REBUILD_SECONDS = int(os.getenv("REVOCATION_REBUILD_SECONDS", "3600"))
+REVOCATION_OVERLAP_SECONDS = int(os.getenv("REVOCATION_OVERLAP_SECONDS", "60"))
+
+# Scheme used for newly written env values: "envelope" or the legacy "rsa".
+# Existing rows keep decrypting with whatever scheme they were written with.
+ENV_ENCRYPTION_SCHEME = os.getenv("ENV_ENCRYPTION_SCHEME", "envelope")
+# Comma separated "<version>:<base64 32 byte key>" pairs. Add a new version and
+# run `manage.py rotate_env_keys` to rotate. Defaults to a key derived from
+# SECRET_KEY when unset.
+ENV_MASTER_KEYS = os.getenv("ENV_MASTER_KEYS", "")
+# Version used to wrap new data keys, defaults to the highest configured one
+ENV_MASTER_KEY_VERSION = int(os.getenv("ENV_MASTER_KEY_VERSION", "0")) or None
+
+# Pre-generated RSA keypairs for the rsa scheme, a size of 0 disables the pool
+RSA_KEY_POOL_SIZE = int(os.getenv("RSA_KEY_POOL_SIZE", "32"))
+RSA_KEY_POOL_LOW_WATER = int(os.getenv("RSA_KEY_POOL_LOW_WATER", "8"))
+RSA_KEY_POOL_WORKERS = int(os.getenv("RSA_KEY_POOL_WORKERS", "2"))
+
+# "strict" writes every get_env decrement to the database, "write_behind"
+# batches them per process and may over-serve an env by up to about
+# 2 * QUOTA_FLUSH_HITS requests per worker process, see apps/envs/quota.py
+QUOTA_MODE = os.getenv("QUOTA_MODE", "strict")
+QUOTA_FLUSH_INTERVAL_MS = int(os.getenv("QUOTA_FLUSH_INTERVAL_MS", "500"))
+QUOTA_FLUSH_HITS = int(os.getenv("QUOTA_FLUSH_HITS", "50"))
+
+# Per-process cache of decrypted env values, a size of 0 disables it
+SECRET_CACHE_SIZE = int(os.getenv("SECRET_CACHE_SIZE", "1024"))
+SECRET_CACHE_TTL = int(os.getenv("SECRET_CACHE_TTL", "60"))  # seconds
+
+# Upper bound on the number of secrets fetched by one batch get request
+BATCH_GET_MAX_ITEMS = int(os.getenv("BATCH_GET_MAX_ITEMS", "200"))
+# Upper bound on the number of secrets in one .env or JSON import
+ENV_IMPORT_MAX_ITEMS = int(os.getenv("ENV_IMPORT_MAX_ITEMS", "500"))
+
+# Large secrets sent to the upload endpoint are encrypted and stored in
+# chunks of LARGE_SECRET_CHUNK_SIZE bytes, up to LARGE_SECRET_MAX_BYTES each
+LARGE_SECRET_CHUNK_SIZE = int(os.getenv("LARGE_SECRET_CHUNK_SIZE", str(64 * 1024)))
+LARGE_SECRET_MAX_BYTES = int(os.getenv("LARGE_SECRET_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# Per-process cache of authenticated users, keyed by id. Updates and deletes
+# only invalidate the process that made them, the others may authorize with
+# the old user for up to PRINCIPAL_CACHE_TTL seconds
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "4096"))
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "5"))  # seconds
+
+# Default and maximum page size of keyset paginated listings
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+# Rows fetched from the database and flushed to the client per chunk when a
+# listing is requested with ?stream=json or ?stream=ndjson
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "500"))
+
+# Process pool that decrypts large listings and encrypts bulk imports, 0
+# workers runs the crypto inline. Batches shorter than DECRYPT_POOL_MIN_ITEMS
+# are always handled inline. Every server worker starts its own pool, so up
+# to SERVER_WORKERS * DECRYPT_POOL_WORKERS processes compete for the cores;
+# the default shares the cores among the server workers (gunicorn.conf.py
+# exports SERVER_WORKERS).
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "1"))
+DECRYPT_POOL_WORKERS = int(
+    os.getenv(
+        "DECRYPT_POOL_WORKERS",
+        str(max(1, (os.cpu_count() or 1) // max(1, SERVER_WORKERS))),
+    )
+)
+DECRYPT_POOL_MIN_ITEMS = int(os.getenv("DECRYPT_POOL_MIN_ITEMS", "32"))
+DECRYPT_POOL_CHUNK_SIZE = int(os.getenv("DECRYPT_POOL_CHUNK_SIZE", "64"))
+# Threads that run encryption and password hashing for the async views
+CRYPTO_THREADS = int(os.getenv("CRYPTO_THREADS", "4"))
+
+# Serve the native async views, for ASGI deployments (see asgi.py)
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "0") == "1"
+
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# DEBUG also records every SQL query per connection, so turn it off under gunicorn
+DEBUG = os.getenv("DEBUG", "1") == "1"
+
+# Bearer token required to scrape /metrics, open when empty. Set
+# PROMETHEUS_MULTIPROC_DIR to aggregate metrics across worker processes.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
 
-ALLOWED_HOSTS = []
+# Requests sent with "X-Profile: <PROFILE_TOKEN>" are profiled, plus a random
+# PROFILE_SAMPLE_RATE share of all requests (see secret_manager/profiling.py)
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", str(BASE_DIR / "profiles"))
+PROFILE_MAX_DUMPS = int(os.getenv("PROFILE_MAX_DUMPS", "100"))
+# Requests slower than this are logged to secret_manager.slow_requests
+SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", "1000"))
+
+# Check views against their @query_budget: "off", "warn" (log) or "raise"
+QUERY_BUDGETS = os.getenv("QUERY_BUDGETS", "warn" if DEBUG else "off")
+# A statement run this many times in one request is reported as an N+1
+QUERY_REPEAT_LIMIT = int(os.getenv("QUERY_REPEAT_LIMIT", "3"))
+
+# Comma separated, e.g. "api.example.com,localhost"
+ALLOWED_HOSTS = [host for host in os.getenv("ALLOWED_HOSTS", "").split(",") if host]
 
 
 # Application definition
@@ -52,6 +154,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "secret_manager.metrics.metrics_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -60,6 +163,9 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
+    "secret_manager.profiling.profiling_middleware",
+    "secret_manager.querybudget.query_budget_middleware",
+    "secret_manager.db_router.read_your_writes_middleware",
 ]
 
 
@@ -106,19 +212,39 @@ WSGI_APPLICATION = "secret_manager.wsgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
-db_url = urlparse(os.environ.get("DATABASE_URL"))
-
+# Connection options come from DATABASE_URL query parameters or DB_* env
+# vars, see secret_manager/db.py. Persistent connections are off by default
+# under ASGI, where they are not reused; use pool=1 there instead.
 DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.postgresql",
-        "NAME": db_url.path[1:],
-        "USER": db_url.username,
-        "PASSWORD": db_url.password,
-        "HOST": db_url.hostname,
-        "PORT": db_url.port,
-    }
+    "default": database_config(
+        os.environ.get("DATABASE_URL"),
+        default_conn_max_age=0 if ASYNC_VIEWS else 60,
+    )
 }
 
+# Read replicas: every REPLICA*_DATABASE_URL env var becomes a database
+# alias, e.g. REPLICA1_DATABASE_URL -> "replica1". Other *_DATABASE_URL vars,
+# such as TEST_DATABASE_URL, are left alone. Reads go to a random replica,
+# see secret_manager/db_router.py.
+REPLICA_DATABASES = sorted(
+    name[: -len("_DATABASE_URL")].lower()
+    for name in os.environ
+    if name.startswith("REPLICA") and name.endswith("_DATABASE_URL")
+)
+for alias in REPLICA_DATABASES:
+    DATABASES[alias] = {
+        **database_config(
+            os.environ[f"{alias.upper()}_DATABASE_URL"],
+            default_conn_max_age=0 if ASYNC_VIEWS else 60,
+        ),
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["secret_manager.db_router.ReplicaRouter"]
+
+# Seconds a client keeps reading from the primary after its own write
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
 PASSWORD_HASHERS = [
     "django.contrib.auth.hashers.PBKDF2PasswordHasher",
     "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
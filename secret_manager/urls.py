@@ -20,10 +20,15 @@ from django.urls import include, path
 
 from secret_manager.apps.envs import urls as env_urls
 from secret_manager.apps.users import urls as users_urls
-from secret_manager.root import root
+from secret_manager.root import healthz, metrics_view, profile, profiles, readyz, root
 
 urlpatterns = [
     path("", root),
+    path("healthz", healthz),
+    path("readyz", readyz),
+    path("metrics", metrics_view),
+    path("profiles/", profiles),
+    path("profiles/<str:name>", profile),
     path("admin/", admin.site.urls),
     path("api/v1/user/", include(users_urls.urlpatterns), name="users"),
     path("api/v1/env/", include(env_urls.urlpatterns), name="envs"),